@@ -1,3 +1,59 @@
 from django.contrib import admin
+from django.db.models import Min, OuterRef, Subquery, Sum
+
+from ads.models import ModerationTotal, ModerationStat
 
 # Register your models here.
+
+class _ReadOnlyAdmin(admin.ModelAdmin):
+    # the counters are maintained by the moderation code and rebuilt with
+    # the rebuild_moderation_stats command, never edited by hand
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class _SlotSumAdmin(_ReadOnlyAdmin):
+    # record_moderation spreads each counter over several slot rows, and a
+    # single slot can be negative. list one row per counter with the sum
+    # over its slots instead
+    counter_fields = ()
+    list_display_links = None
+
+    def get_queryset(self, request):
+        counters = self.model.objects.values(*self.counter_fields).order_by()
+        sums = (
+            counters.filter(**{field: OuterRef(field) for field in self.counter_fields})
+            .annotate(total=Sum('count')).values('total')
+        )
+        return (
+            super().get_queryset(request)
+            .filter(pk__in=counters.annotate(first=Min('pk')).values('first'))
+            .annotate(total=Subquery(sums))
+        )
+
+    @admin.display(description='count', ordering='total')
+    def total(self, obj):
+        return obj.total
+
+
+@admin.register(ModerationTotal)
+class ModerationTotalAdmin(_SlotSumAdmin):
+    counter_fields = ('state', 'category')
+    list_display = ('state', 'category', 'total')
+    list_filter = ('state',)
+    ordering = ('state', 'category')
+
+
+@admin.register(ModerationStat)
+class ModerationStatAdmin(_SlotSumAdmin):
+    counter_fields = ('day', 'state', 'category')
+    list_display = ('day', 'state', 'category', 'total')
+    list_filter = ('state', 'category')
+    date_hierarchy = 'day'
+    ordering = ('-day', 'state', 'category')
@@ -0,0 +1,139 @@
+from datetime import timedelta
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ads.models import VehicleAD, ArchivedVehicleAD, record_moderation
+from apis.clients import object_storage
+
+
+class Command(BaseCommand):
+    help = (
+        'Moves old rejected ads, uploads that were never finalized and, when '
+        'RETENTION_ACCEPTED_DAYS is set, expired ads into the archive table and '
+        'deletes their images. Safe to stop and run again at any point'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=settings.RETENTION_CHUNK_SIZE)
+        parser.add_argument('--sleep', type=float, default=settings.RETENTION_CHUNK_SLEEP,
+                            help='seconds to pause between chunks')
+        parser.add_argument('--max-chunks', type=int, default=0, help='stop after this many chunks (0: no limit)')
+        parser.add_argument('--dry-run', action='store_true', help='only count what would be archived')
+
+    def handle(self, *args, **options):
+        self._options = options
+        self._chunks = 0
+
+        if options['dry_run']:
+            for reason, condition in self.__rules():
+                self.stdout.write(f"{reason}: {VehicleAD.objects.filter(condition).count()} ads")
+            return
+
+        try:
+            # images of ads archived by an interrupted run go first
+            last_pk = 0
+            while self.__has_budget():
+                leftovers = list(
+                    ArchivedVehicleAD.objects.filter(image_deleted=False, pk__gt=last_pk)
+                    .order_by('pk')[:options['chunk_size']]
+                )
+                if not leftovers:
+                    break
+                last_pk = leftovers[-1].pk
+                self.__delete_images(leftovers)
+                self.__pause()
+
+            for reason, condition in self.__rules():
+                archived_total, last_pk = 0, 0
+                while self.__has_budget():
+                    archived = self.__archive_chunk(reason, condition, last_pk)
+                    if not archived:
+                        break
+                    last_pk = archived[-1].pk
+                    archived_total += len(archived)
+                    self.__delete_images(archived)
+                    self.__pause()
+                self.stdout.write(f"{reason}: archived {archived_total} ads")
+        except ConnectionError as e:
+            raise CommandError(f"{e}. archived ads keep their images until the next run")
+
+    def __rules(self):
+        now = timezone.now()
+        rejected_before = now - timedelta(days=settings.RETENTION_REJECTED_DAYS)
+        rules = [
+            (
+                ArchivedVehicleAD.Reason.REJECTED,
+                Q(state=VehicleAD.StateAD.REJECTED) & (
+                    Q(moderated_at__lt=rejected_before) |
+                    Q(moderated_at__isnull=True, created_at__lt=rejected_before)
+                )
+            ),
+            (
+                ArchivedVehicleAD.Reason.STALE_PENDING,
+                Q(
+                    state=VehicleAD.StateAD.PENDING,
+                    created_at__lt=now - timedelta(days=settings.RETENTION_PENDING_DAYS)
+                )
+            ),
+        ]
+        if settings.RETENTION_ACCEPTED_DAYS > 0:
+            rules.append((
+                ArchivedVehicleAD.Reason.EXPIRED,
+                Q(
+                    state=VehicleAD.StateAD.ACCEPTED,
+                    created_at__lt=now - timedelta(days=settings.RETENTION_ACCEPTED_DAYS)
+                )
+            ))
+        return rules
+
+    def __archive_chunk(self, reason, condition, last_pk):
+        # walks the table once in primary key order; rows another process
+        # holds are skipped instead of waited for
+        with transaction.atomic():
+            ads = list(
+                VehicleAD.objects.select_for_update(skip_locked=True)
+                .filter(condition, pk__gt=last_pk)
+                .order_by('pk')[:self._options['chunk_size']]
+            )
+            if not ads:
+                return []
+
+            archived = [ArchivedVehicleAD.from_ad(ad, reason) for ad in ads]
+            ArchivedVehicleAD.objects.bulk_create(archived, ignore_conflicts=True)
+            VehicleAD.objects.filter(pk__in=[ad.pk for ad in ads]).delete()
+
+            removed = {}
+            for ad in ads:
+                removed[(ad.state, ad.category)] = removed.get((ad.state, ad.category), 0) + 1
+            for (state, category), count in removed.items():
+                record_moderation(None, from_state=state, from_category=category, count=count)
+        return archived
+
+    def __delete_images(self, archived):
+        # only after the rows are committed: a failure here leaves an image
+        # without an ad, never an ad without its image
+        paths = {}
+        for ad in archived:
+            try:
+                paths[ad.pk] = object_storage.path_from_url(ad.image)
+            except ValueError:
+                pass
+
+        failed = set(object_storage.delete_many(list(paths.values())))
+        ArchivedVehicleAD.objects.filter(
+            pk__in=[ad.pk for ad in archived if paths.get(ad.pk) not in failed]
+        ).update(image_deleted=True)
+
+    def __has_budget(self):
+        return not self._options['max_chunks'] or self._chunks < self._options['max_chunks']
+
+    def __pause(self):
+        self._chunks += 1
+        if self._options['sleep'] > 0:
+            time.sleep(self._options['sleep'])
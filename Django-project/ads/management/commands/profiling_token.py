@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from apis.profiling import make_profiling_token
+
+
+class Command(BaseCommand):
+    help = 'Prints a signed token that enables profiling for requests sending it in the profiling header'
+
+    def handle(self, *args, **options):
+        self.stdout.write(make_profiling_token())
@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ads.stats import rebuild_moderation_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes the moderation counters from the ads table. Daily counts are '
+        'rebuilt from created_at (review, pending) and moderated_at (accepted, '
+        'rejected), so ads moderated before moderated_at existed only show up in '
+        'the totals. Run it when few ads are being submitted: the scan is not '
+        'isolated from concurrent submissions.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='only rebuild the daily counts of the last N days')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['days'] is not None:
+            since = timezone.now().date() - timedelta(days=options['days'] - 1)
+
+        totals, daily = rebuild_moderation_stats(since=since)
+
+        self.stdout.write(f"rebuilt {totals} totals and {daily} daily counters")
@@ -0,0 +1,111 @@
+from datetime import timedelta
+
+import os
+import sqlite3
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from ads.models import VehicleAD, ArchivedVehicleAD
+from apis.clients import object_storage
+
+
+class Command(BaseCommand):
+    help = (
+        'Lists the bucket and reports (or with --delete removes) objects that no ad '
+        'refers to and that are older than the grace period'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete', action='store_true', help='delete the orphans instead of only listing them')
+        parser.add_argument('--grace-hours', type=float, default=settings.RECONCILE_GRACE_HOURS)
+        parser.add_argument('--prefix', default='', help='only reconcile keys starting with this prefix')
+        parser.add_argument('--work-dir', default=None, help='where to keep the temporary key index')
+        parser.add_argument('--quiet', action='store_true', help='print the totals only')
+
+    def handle(self, *args, **options):
+        # images created after this point are younger than the grace period,
+        # so taking the snapshot of known keys first is enough
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+
+        fd, path = tempfile.mkstemp(prefix='reconcile_bucket_', suffix='.sqlite3', dir=options['work_dir'])
+        os.close(fd)
+        try:
+            # the known keys live in an on-disk index instead of memory; a
+            # sorted merge would need MySQL to order tens of millions of
+            # images the way S3 does, which its collations do not
+            index = sqlite3.connect(path)
+            index.execute('PRAGMA journal_mode = OFF')
+            index.execute('PRAGMA synchronous = OFF')
+            index.execute('CREATE TABLE keys (path TEXT PRIMARY KEY) WITHOUT ROWID')
+            known = self.__index_known_keys(index)
+
+            scanned = orphans = orphan_bytes = deleted = 0
+            pending = []
+            for page in object_storage.list_objects(prefix=options['prefix']):
+                scanned += len(page)
+                paths = [item['path'] for item in page]
+                referenced = {
+                    row[0] for row in index.execute(
+                        f"SELECT path FROM keys WHERE path IN ({','.join('?' * len(paths))})", paths
+                    )
+                } if paths else set()
+
+                for item in page:
+                    if item['path'] in referenced or item['last_modified'] >= cutoff:
+                        continue
+                    orphans += 1
+                    orphan_bytes += item['size']
+                    if not options['quiet']:
+                        self.stdout.write(f"{item['path']}\t{item['size']}\t{item['last_modified'].isoformat()}")
+                    if options['delete']:
+                        pending.append(item['path'])
+
+                if len(pending) >= 1000:
+                    deleted += len(pending) - len(object_storage.delete_many(pending))
+                    pending = []
+
+            if pending:
+                deleted += len(pending) - len(object_storage.delete_many(pending))
+            index.close()
+        except ConnectionError as e:
+            raise CommandError(str(e))
+        finally:
+            os.remove(path)
+
+        self.stdout.write(
+            f"{known} images referenced, {scanned} objects scanned, "
+            f"{orphans} orphans ({orphan_bytes} bytes), {deleted} deleted"
+        )
+
+    def __index_known_keys(self, index) -> int:
+        # archived ads whose image is not deleted yet are archive_ads' to clean up.
+        # paged by primary key: MySQL drivers buffer whole result sets
+        sources = [
+            VehicleAD.objects.all(),
+            ArchivedVehicleAD.objects.filter(image_deleted=False),
+        ]
+        known = 0
+        for ads in sources:
+            last_pk = 0
+            while True:
+                rows = list(ads.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'image')[:5000])
+                if not rows:
+                    break
+                last_pk = rows[-1][0]
+
+                batch = []
+                for _, image in rows:
+                    try:
+                        batch.append((object_storage.path_from_url(image),))
+                    except ValueError:
+                        continue
+                known += self.__insert(index, batch)
+        return known
+
+    def __insert(self, index, batch) -> int:
+        index.executemany('INSERT OR IGNORE INTO keys (path) VALUES (?)', batch)
+        index.commit()
+        return len(batch)
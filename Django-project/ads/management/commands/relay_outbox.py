@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from ads.outbox import relay_batch
+
+
+class Command(BaseCommand):
+    help = 'Publishes the queue messages and emails written to the outbox by the ad views and validate_ad'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.OUTBOX_BATCH_SIZE)
+        parser.add_argument('--interval', type=float, default=settings.OUTBOX_POLL_INTERVAL)
+        parser.add_argument('--once', action='store_true', help='relay what is in the outbox now and exit')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            try:
+                relayed = relay_batch(options['batch_size'])
+            except Exception as e:
+                # broker and database errors alike: the batch was rolled back
+                # and stays in the outbox, so keep going and retry it
+                self.stderr.write(f"relaying the outbox failed: {e!r}")
+                relayed = 0
+
+            if options['once'] and relayed < options['batch_size']:
+                break
+            if relayed < options['batch_size']:
+                time.sleep(options['interval'])
@@ -0,0 +1,20 @@
+# Generated by Django 4.1.2 on 2026-10-18 23:10
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0002_vehiclead_category'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vehiclead',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
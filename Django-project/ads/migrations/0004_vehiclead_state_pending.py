@@ -0,0 +1,18 @@
+# Generated by Django 4.1.2 on 2026-10-18 23:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0003_vehiclead_created_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='vehiclead',
+            name='state',
+            field=models.CharField(choices=[('accepted', 'Accepted'), ('review', 'Review'), ('rejected', 'Rejected'), ('pending', 'Pending')], default='review', max_length=10),
+        ),
+    ]
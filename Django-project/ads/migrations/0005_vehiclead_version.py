@@ -0,0 +1,18 @@
+# Generated by Django 4.1.2 on 2026-10-18 23:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0004_vehiclead_state_pending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vehiclead',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
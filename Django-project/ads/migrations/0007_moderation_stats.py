@@ -0,0 +1,45 @@
+# Generated by Django 4.1.2 on 2026-10-18 23:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0006_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModerationStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('state', models.CharField(choices=[('accepted', 'Accepted'), ('review', 'Review'), ('rejected', 'Rejected'), ('pending', 'Pending')], max_length=10)),
+                ('category', models.CharField(blank=True, default='', max_length=255)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ModerationTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.CharField(choices=[('accepted', 'Accepted'), ('review', 'Review'), ('rejected', 'Rejected'), ('pending', 'Pending')], max_length=10)),
+                ('category', models.CharField(blank=True, default='', max_length=255)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='vehiclead',
+            name='moderated_at',
+            field=models.DateTimeField(blank=True, default=None, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='moderationtotal',
+            constraint=models.UniqueConstraint(fields=('state', 'category'), name='unique_moderation_total'),
+        ),
+        migrations.AddConstraint(
+            model_name='moderationstat',
+            constraint=models.UniqueConstraint(fields=('day', 'state', 'category'), name='unique_moderation_stat'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.1.2 on 2026-10-18 23:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0007_moderation_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedVehicleAD',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('description', models.CharField(default='', max_length=4096)),
+                ('state', models.CharField(choices=[('accepted', 'Accepted'), ('review', 'Review'), ('rejected', 'Rejected'), ('pending', 'Pending')], max_length=10)),
+                ('image', models.CharField(max_length=1024)),
+                ('email', models.CharField(max_length=2048)),
+                ('category', models.CharField(blank=True, default=None, max_length=1024, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('moderated_at', models.DateTimeField(blank=True, default=None, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('reason', models.CharField(choices=[('rejected', 'Rejected'), ('stale_pending', 'Stale Pending'), ('expired', 'Expired')], max_length=16)),
+                ('image_deleted', models.BooleanField(default=False)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.2 on 2026-10-18 23:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0008_archivedvehiclead'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='outboxmessage',
+            name='kind',
+            field=models.CharField(choices=[('validation', 'Validation'), ('received_email', 'Received Email'), ('success_email', 'Success Email'), ('failure_email', 'Failure Email')], max_length=32),
+        ),
+    ]
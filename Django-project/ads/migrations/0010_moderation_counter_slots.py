@@ -0,0 +1,39 @@
+# Generated by Django 4.1.2 on 2026-10-18 23:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0009_outboxmessage_result_emails'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='moderationstat',
+            name='unique_moderation_stat',
+        ),
+        migrations.RemoveConstraint(
+            model_name='moderationtotal',
+            name='unique_moderation_total',
+        ),
+        migrations.AddField(
+            model_name='moderationstat',
+            name='slot',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='moderationtotal',
+            name='slot',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddConstraint(
+            model_name='moderationstat',
+            constraint=models.UniqueConstraint(fields=('day', 'state', 'category', 'slot'), name='unique_moderation_stat'),
+        ),
+        migrations.AddConstraint(
+            model_name='moderationtotal',
+            constraint=models.UniqueConstraint(fields=('state', 'category', 'slot'), name='unique_moderation_total'),
+        ),
+    ]
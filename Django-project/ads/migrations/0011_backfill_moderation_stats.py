@@ -0,0 +1,20 @@
+from django.db import migrations
+
+from ads.stats import rebuild_moderation_stats
+
+
+def backfill(apps, schema_editor):
+    # the counter tables start out empty; without this the first decision
+    # on an ad submitted before them takes its state's count below zero
+    rebuild_moderation_stats(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ads', '0010_moderation_counter_slots'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,11 @@
-from django.db import models
+from typing import Dict, Tuple
+
+import random
+
+from django.conf import settings
+from django.db import models, transaction, IntegrityError
+from django.db.models import F
+from django.utils import timezone
 
 # Create your models here.
 
@@ -7,6 +14,7 @@ class VehicleAD(models.Model):
         ACCEPTED = 'accepted'
         REVIEW = 'review'
         REJECTED = 'rejected'
+        PENDING = 'pending'
 
     description = models.CharField(max_length=4096, default='')
     state = models.CharField(
@@ -18,6 +26,179 @@ class VehicleAD(models.Model):
     image = models.CharField(max_length=1024, null=False, blank=False)
     email = models.CharField(max_length=2048, null=False, blank=False)
     category = models.CharField(max_length=1024, null=True, blank=True, default=None)
+    created_at = models.DateTimeField(auto_now_add=True)
+    version = models.PositiveIntegerField(default=0)
+    moderated_at = models.DateTimeField(null=True, blank=True, default=None)
+
+    def transition(self, from_state: str, to_state: str, **changes) -> bool:
+        # a single conditional UPDATE touching only the given columns.
+        # returns False when another worker changed the ad first
+        from_category = self.category
+        with transaction.atomic(savepoint=False):
+            updated = VehicleAD.objects.filter(
+                pk=self.pk,
+                state=from_state,
+                version=self.version
+            ).update(state=to_state, version=F('version') + 1, **changes)
+            if updated:
+                record_moderation(
+                    to_state,
+                    changes.get('category', from_category),
+                    from_state=from_state,
+                    from_category=from_category
+                )
+
+        if updated:
+            self.state = to_state
+            self.version += 1
+            for field, value in changes.items():
+                setattr(self, field, value)
+        return bool(updated)
 
     def __str__(self):
         return f'<\n\tid: {self.pk},\n\tstate: {self.state},\n\tdescription: {self.description},\n\timage url: {self.image}\n>'
+
+
+class OutboxMessage(models.Model):
+    class Kind(models.TextChoices):
+        VALIDATION = 'validation'
+        RECEIVED_EMAIL = 'received_email'
+        SUCCESS_EMAIL = 'success_email'
+        FAILURE_EMAIL = 'failure_email'
+
+    kind = models.CharField(max_length=32, choices=Kind.choices, null=False)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def for_submission(cls, ads) -> list:
+        # written in the same transaction as the ads; relay_outbox publishes them
+        ads = list(ads)
+        messages = [cls(kind=cls.Kind.VALIDATION, payload={'ad_id': ad.pk, 'email': ad.email}) for ad in ads]
+        if ads:
+            messages.append(cls(kind=cls.Kind.RECEIVED_EMAIL, payload={'to': ads[0].email}))
+        return cls.objects.bulk_create(messages)
+
+    @classmethod
+    def for_decision(cls, ad: VehicleAD) -> 'OutboxMessage':
+        # written in the same transaction as the moderation decision
+        if ad.state == VehicleAD.StateAD.ACCEPTED:
+            return cls.objects.create(kind=cls.Kind.SUCCESS_EMAIL, payload={'to': ad.email, 'ad_id': ad.pk})
+        return cls.objects.create(kind=cls.Kind.FAILURE_EMAIL, payload={'to': ad.email})
+
+
+class ArchivedVehicleAD(models.Model):
+    class Reason(models.TextChoices):
+        REJECTED = 'rejected'
+        STALE_PENDING = 'stale_pending'
+        EXPIRED = 'expired'
+
+    # same id the ad had in VehicleAD
+    id = models.BigIntegerField(primary_key=True)
+    description = models.CharField(max_length=4096, default='')
+    state = models.CharField(max_length=10, choices=VehicleAD.StateAD.choices, null=False)
+    image = models.CharField(max_length=1024, null=False, blank=False)
+    email = models.CharField(max_length=2048, null=False, blank=False)
+    category = models.CharField(max_length=1024, null=True, blank=True, default=None)
+    created_at = models.DateTimeField(null=False)
+    moderated_at = models.DateTimeField(null=True, blank=True, default=None)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    reason = models.CharField(max_length=16, choices=Reason.choices, null=False)
+    image_deleted = models.BooleanField(default=False)
+
+    @classmethod
+    def from_ad(cls, ad: VehicleAD, reason: str) -> 'ArchivedVehicleAD':
+        return cls(
+            id=ad.pk,
+            description=ad.description,
+            state=ad.state,
+            image=ad.image,
+            email=ad.email,
+            category=ad.category,
+            created_at=ad.created_at,
+            moderated_at=ad.moderated_at,
+            reason=reason
+        )
+
+    def __str__(self):
+        return f'<\n\tid: {self.pk},\n\tstate: {self.state},\n\treason: {self.reason},\n\timage url: {self.image}\n>'
+
+
+class ModerationTotal(models.Model):
+    state = models.CharField(max_length=10, choices=VehicleAD.StateAD.choices, null=False)
+    category = models.CharField(max_length=255, blank=True, default='')
+    # every counter is split over STATS_COUNTER_SLOTS rows; sum them to read it
+    slot = models.PositiveSmallIntegerField(default=0)
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['state', 'category', 'slot'], name='unique_moderation_total'),
+        ]
+
+    def __str__(self):
+        return f'{self.state} {self.category or "-"} #{self.slot}: {self.count}'
+
+
+class ModerationStat(models.Model):
+    day = models.DateField(null=False)
+    state = models.CharField(max_length=10, choices=VehicleAD.StateAD.choices, null=False)
+    category = models.CharField(max_length=255, blank=True, default='')
+    slot = models.PositiveSmallIntegerField(default=0)
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'state', 'category', 'slot'], name='unique_moderation_stat'),
+        ]
+
+    def __str__(self):
+        return f'{self.day} {self.state} {self.category or "-"} #{self.slot}: {self.count}'
+
+
+def record_moderation(
+        to_state: str | None,
+        to_category: str | None = None,
+        from_state: str | None = None,
+        from_category: str | None = None,
+        count: int = 1
+    ) -> None:
+    # ModerationTotal holds how many ads are in each state right now,
+    # ModerationStat how many entered each state per day. call it inside the
+    # transaction that changes the ads so the counters commit with them.
+    # a random slot per call spreads concurrent writers over several rows
+    # instead of queueing them all on the lock of one hot counter; a single
+    # slot can go negative, only the sum over the slots is meaningful
+    slot = random.randrange(max(settings.STATS_COUNTER_SLOTS, 1))
+    deltas: Dict[Tuple, int] = {}
+    if from_state is not None:
+        key = (ModerationTotal, (('state', from_state), ('category', (from_category or '')[:255]), ('slot', slot)))
+        deltas[key] = deltas.get(key, 0) - count
+    if to_state is not None:
+        key = (ModerationTotal, (('state', to_state), ('category', (to_category or '')[:255]), ('slot', slot)))
+        deltas[key] = deltas.get(key, 0) + count
+        key = (ModerationStat, (
+            ('day', timezone.now().date()),
+            ('state', to_state),
+            ('category', (to_category or '')[:255]),
+            ('slot', slot)
+        ))
+        deltas[key] = deltas.get(key, 0) + count
+
+    # always lock the counter rows in the same order to keep concurrent
+    # transitions from deadlocking on each other
+    with transaction.atomic(savepoint=False):
+        for (model, fields), delta in sorted(deltas.items(), key=lambda item: (item[0][0].__name__, item[0][1])):
+            if delta:
+                __increment(model, dict(fields), delta)
+
+
+def __increment(model, fields: dict, delta: int) -> None:
+    if model.objects.filter(**fields).update(count=F('count') + delta):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(count=delta, **fields)
+    except IntegrityError:
+        # created by a concurrent transaction since our UPDATE
+        model.objects.filter(**fields).update(count=F('count') + delta)
@@ -0,0 +1,59 @@
+from collections import defaultdict
+
+from django.db import transaction
+
+from ads.models import OutboxMessage
+from ads.tasks import (
+    validate_ad,
+    send_received_email,
+    send_success_email,
+    send_failure_email
+)
+from apis.clients import rabbitmq, fair_scheduler
+from apis.metrics import track_stage
+
+
+def relay_batch(batch_size: int) -> int:
+    # rows are deleted in the same transaction that locked them, and only
+    # after every publish went through. a crash in between publishes the
+    # batch again, which validate_ad tolerates
+    with transaction.atomic():
+        batch = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True).order_by('pk')[:batch_size]
+        )
+        if not batch:
+            return 0
+
+        validations = defaultdict(list)
+        emails = []
+        results = []
+        for message in batch:
+            if message.kind == OutboxMessage.Kind.VALIDATION:
+                tenant = fair_scheduler.tenant(message.payload['email'])
+                validations[tenant].append(str(message.payload['ad_id']))
+            elif message.kind == OutboxMessage.Kind.RECEIVED_EMAIL:
+                emails.append(message.payload['to'])
+            else:
+                results.append(message)
+
+        with track_stage('outbox_publish'):
+            for tenant, ad_ids in validations.items():
+                priorities = fair_scheduler.admit(tenant, count=len(ad_ids))
+                try:
+                    rabbitmq.put_many(ad_ids, tenant=tenant, priorities=priorities)
+                except Exception:
+                    # the batch is rolled back and admitted again on the retry
+                    fair_scheduler.done(tenant, count=len(ad_ids))
+                    raise
+            for to in emails:
+                send_received_email.delay(to)
+            for message in results:
+                if message.kind == OutboxMessage.Kind.SUCCESS_EMAIL:
+                    send_success_email.delay(message.payload['to'], message.payload['ad_id'])
+                else:
+                    send_failure_email.delay(message.payload['to'])
+            if validations:
+                validate_ad.delay()
+
+        OutboxMessage.objects.filter(pk__in=[message.pk for message in batch]).delete()
+    return len(batch)
@@ -1,55 +1,206 @@
 from celery import shared_task
 
-from ads.models import VehicleAD
+from ads.models import VehicleAD, OutboxMessage
 from apis.clients import (
     rabbitmq,
     imagga_client,
-    email_client
+    email_client,
+    fair_scheduler
 )
+from apis.limiters import RateLimitExceeded
+from apis.breakers import CircuitOpenError
+from apis.admission import admission_controller
+from apis.metrics import track_stage, ADS_MODERATED
+from apis.notifications import publish_moderation
 
 from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 
 
                 
 @shared_task
 def validate_ad() -> None:
+    deferred = 0
     while True:
         print("waiting for new ads")
-        ad_id = rabbitmq.pop()
+        ad_id, headers, delivery_tag = rabbitmq.pop_message()
         if ad_id == '':
             print("no new ads")
             break
-        
-        ad_id = int(ad_id)
-        print(f"validating ad with id: {ad_id}")
-        ad = VehicleAD.objects.get(pk=ad_id)
-        
-        print(f"add image url: {ad.image}")
         try:
-            result = imagga_client.get_tags(ad.image)
-            print(f"imagga result for ad with id: {ad_id} is: {result}")
-        except ValueError as e:
-            print(f"imagga error for ad with id: {ad_id} is: {e}")
-            ad.status = VehicleAD.REJECTED
-            ad.save()
+            outcome = __handle(ad_id, headers)
+        except BaseException:
+            # neither decided nor handed on to a retry queue. the broker
+            # delivers it again, as it would if this worker died right here
+            rabbitmq.reject(delivery_tag)
+            raise
+        # acked only once its decision, retry or deferral is stored
+        rabbitmq.ack(delivery_tag)
+
+        if outcome == 'paused':
+            break
+        if outcome != 'deferred':
+            deferred = 0
             continue
+        deferred += 1
+        if deferred >= settings.FAIR_SCHEDULING_MAX_DEFERRALS:
+            # only capped submitters are left in the queue
+            print("ads of capped submitters only. checking again in 1s")
+            validate_ad.apply_async(countdown=1)
+            break
 
-        for tag in result['result']['tags']:
-            if tag['tag']['en'] in settings.VALID_CATEGORIES:
-                ad.state = VehicleAD.StateAD.ACCEPTED
-                ad.category = tag['tag']['en']
-                ad.save()
-                email_client.send_success_message(ad.email, ad.pk)
-                print(f"ad with id: {ad_id} is accepted")
-                break
-        else:
-            ad.state = VehicleAD.StateAD.REJECTED
-            ad.category = None
-            email_client.send_failure_message(ad.email)
-            print(f"ad with id: {ad_id} is rejected")
-            ad.save()
 
+def __handle(ad_id: str, headers: dict) -> str:
+    attempt = int(headers.get('x-attempt', 0))
+    tenant = headers.get('x-tenant')
 
-@shared_task
+    lease = fair_scheduler.acquire(tenant) if tenant is not None else None
+    if tenant is not None and lease is None:
+        # the submitter already has its share of workers busy. send the ad
+        # to the back of the line without counting an attempt
+        rabbitmq.put(ad_id, attempt=attempt, tenant=tenant, priority=0)
+        return 'deferred'
+
+    if 'x-enqueued-at' in headers:
+        admission_controller.record_validation_lag(float(headers['x-enqueued-at']))
+    try:
+        __validate(int(ad_id))
+        if tenant is not None:
+            fair_scheduler.done(tenant)
+    except (RateLimitExceeded, CircuitOpenError) as e:
+        # imagga is not taking calls right now. not the ad's fault, so
+        # it keeps its attempt count. the rest of the queue has to wait too
+        delay = rabbitmq.retry(
+            ad_id,
+            attempt,
+            delay=e.retry_after,
+            tenant=tenant,
+            priority=fair_scheduler.priority(tenant) if tenant is not None else None
+        )
+        print(f"imagga is not available ({e}). ad with id: {ad_id} deferred for {delay}s")
+        validate_ad.apply_async(countdown=delay)
+        return 'paused'
+    except ConnectionError as e:
+        # an upstream call failed (timeout, 5xx, a failed probe). the ad
+        # keeps its attempt count so an outage cannot park healthy ads;
+        # repeated failures open the breaker and pause the whole queue
+        delay = rabbitmq.retry(
+            ad_id,
+            attempt,
+            tenant=tenant,
+            priority=fair_scheduler.priority(tenant) if tenant is not None else None
+        )
+        print(f"upstream call failed ({e}). ad with id: {ad_id} deferred for {delay}s")
+        validate_ad.apply_async(countdown=delay)
+    except Exception as e:
+        attempt += 1
+        if attempt >= settings.RABBITMQ_MAX_ATTEMPTS:
+            rabbitmq.park(ad_id, attempt=attempt, reason=repr(e), tenant=tenant)
+            if tenant is not None:
+                fair_scheduler.done(tenant)
+            print(f"validating ad with id: {ad_id} failed {attempt} times ({e}). parked in the dead letter queue")
+            return 'parked'
+        delay = rabbitmq.retry(
+            ad_id,
+            attempt,
+            tenant=tenant,
+            priority=fair_scheduler.priority(tenant) if tenant is not None else None
+        )
+        print(f"validating ad with id: {ad_id} failed ({e}). retry {attempt} in {delay}s")
+        validate_ad.apply_async(countdown=delay)
+    finally:
+        if lease is not None:
+            fair_scheduler.release(tenant, lease)
+    return 'handled'
+
+
+def __validate(ad_id: int) -> None:
+    print(f"validating ad with id: {ad_id}")
+    ad = VehicleAD.objects.only('image', 'email', 'state', 'category', 'version').filter(pk=ad_id).first()
+    if ad is None or ad.state != VehicleAD.StateAD.REVIEW:
+        print(f"ad with id: {ad_id} is not waiting for review")
+        return
+
+    print(f"add image url: {ad.image}")
+    try:
+        with track_stage('imagga_call'):
+            result = imagga_client.get_tags(ad.image)
+        print(f"imagga result for ad with id: {ad_id} is: {result}")
+    except ValueError as e:
+        print(f"imagga error for ad with id: {ad_id} is: {e}")
+        with track_stage('db_update'):
+            moderated = ad.transition(
+                VehicleAD.StateAD.REVIEW,
+                VehicleAD.StateAD.REJECTED,
+                category=None,
+                moderated_at=timezone.now()
+            )
+        if moderated:
+            transaction.on_commit(lambda: publish_moderation(ad.pk, ad.state))
+            ADS_MODERATED.labels(ad.state).inc()
+        return
+
+    with track_stage('decision'):
+        category = next(
+            (
+                tag['tag']['en'] for tag in result['result']['tags']
+                if tag['tag']['en'] in settings.VALID_CATEGORIES
+            ),
+            None
+        )
+
+    with track_stage('db_update'), transaction.atomic():
+        moderated = ad.transition(
+            VehicleAD.StateAD.REVIEW,
+            VehicleAD.StateAD.ACCEPTED if category is not None else VehicleAD.StateAD.REJECTED,
+            category=category,
+            moderated_at=timezone.now()
+        )
+        if moderated:
+            # relay_outbox sends the result email once the decision is committed
+            OutboxMessage.for_decision(ad)
+            transaction.on_commit(lambda: publish_moderation(ad.pk, ad.state))
+
+    if not moderated:
+        print(f"ad with id: {ad_id} was moderated by another worker")
+        return
+
+    if ad.state == VehicleAD.StateAD.ACCEPTED:
+        print(f"ad with id: {ad_id} is accepted")
+    else:
+        print(f"ad with id: {ad_id} is rejected")
+    ADS_MODERATED.labels(ad.state).inc()
+
+
+@shared_task(
+    autoretry_for=(ConnectionError,),
+    retry_backoff=True,
+    retry_backoff_max=settings.EMAIL_RETRY_BACKOFF_MAX,
+    max_retries=settings.EMAIL_MAX_RETRIES
+)
 def send_received_email(to: str) -> None:
-    email_client.send_received_ad_message(to=to)
+    with track_stage('email_send'):
+        email_client.send_received_ad_message(to=to)
+
+
+@shared_task(
+    autoretry_for=(ConnectionError,),
+    retry_backoff=True,
+    retry_backoff_max=settings.EMAIL_RETRY_BACKOFF_MAX,
+    max_retries=settings.EMAIL_MAX_RETRIES
+)
+def send_success_email(to: str, ad_id: int) -> None:
+    with track_stage('email_send'):
+        email_client.send_success_message(to=to, ad_id=ad_id)
+
+
+@shared_task(
+    autoretry_for=(ConnectionError,),
+    retry_backoff=True,
+    retry_backoff_max=settings.EMAIL_RETRY_BACKOFF_MAX,
+    max_retries=settings.EMAIL_MAX_RETRIES
+)
+def send_failure_email(to: str) -> None:
+    with track_stage('email_send'):
+        email_client.send_failure_message(to=to)
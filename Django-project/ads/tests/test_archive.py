@@ -0,0 +1,86 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.utils import timezone
+
+from ads.models import VehicleAD, ArchivedVehicleAD
+from ads.stats import rebuild_moderation_stats
+from ads.tests.utils import totals
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch('ads.management.commands.archive_ads.object_storage')
+        self.addCleanup(patcher.stop)
+        self.storage = patcher.start()
+        self.storage.path_from_url.side_effect = lambda url: url.rsplit('/', 1)[1]
+        self.storage.delete_many.return_value = []
+
+        old = timezone.now() - timedelta(days=max(settings.RETENTION_REJECTED_DAYS, settings.RETENTION_PENDING_DAYS) + 1)
+        self.ads = {}
+        for name, state, moderated_at in (
+            ('old-rejected', VehicleAD.StateAD.REJECTED, old),
+            ('new-rejected', VehicleAD.StateAD.REJECTED, timezone.now()),
+            ('old-pending', VehicleAD.StateAD.PENDING, None),
+            ('old-accepted', VehicleAD.StateAD.ACCEPTED, old),
+        ):
+            ad = VehicleAD.objects.create(
+                image=f'https://bucket.example.com/{name}.jpg',
+                email='a@b.com',
+                state=state,
+                moderated_at=moderated_at
+            )
+            VehicleAD.objects.filter(pk=ad.pk).update(created_at=old)
+            self.ads[name] = ad.pk
+        rebuild_moderation_stats()
+
+    def archive(self, **options):
+        call_command('archive_ads', sleep=0, stdout=StringIO(), **options)
+
+    def deleted_images(self):
+        return sorted(path for call in self.storage.delete_many.call_args_list for path in call.args[0])
+
+    def test_old_rejected_and_stale_pending_ads_move_to_the_archive(self):
+        self.archive()
+
+        archived = dict(ArchivedVehicleAD.objects.values_list('pk', 'reason'))
+        self.assertEqual(archived, {
+            self.ads['old-rejected']: ArchivedVehicleAD.Reason.REJECTED,
+            self.ads['old-pending']: ArchivedVehicleAD.Reason.STALE_PENDING,
+        })
+        self.assertFalse(VehicleAD.objects.filter(pk__in=archived).exists())
+        self.assertEqual(self.deleted_images(), ['old-pending.jpg', 'old-rejected.jpg'])
+        self.assertTrue(all(ArchivedVehicleAD.objects.values_list('image_deleted', flat=True)))
+        self.assertEqual(totals(), {('rejected', ''): 1, ('accepted', ''): 1})
+
+    def test_images_that_failed_to_delete_are_retried_next_run(self):
+        self.storage.delete_many.side_effect = lambda paths: paths
+        self.archive()
+        self.assertFalse(any(ArchivedVehicleAD.objects.values_list('image_deleted', flat=True)))
+
+        self.storage.delete_many.reset_mock(side_effect=True)
+        self.storage.delete_many.return_value = []
+        self.archive()
+
+        self.assertEqual(self.deleted_images(), ['old-pending.jpg', 'old-rejected.jpg'])
+        self.assertTrue(all(ArchivedVehicleAD.objects.values_list('image_deleted', flat=True)))
+
+    def test_storage_outage_keeps_what_was_archived(self):
+        self.storage.delete_many.side_effect = ConnectionError('storage is unavailable')
+
+        with self.assertRaises(CommandError):
+            self.archive()
+
+        self.assertTrue(ArchivedVehicleAD.objects.filter(image_deleted=False).exists())
+        self.assertFalse(VehicleAD.objects.filter(pk=self.ads['old-rejected']).exists())
+
+    def test_dry_run(self):
+        self.archive(dry_run=True)
+
+        self.assertFalse(ArchivedVehicleAD.objects.exists())
+        self.assertEqual(VehicleAD.objects.count(), 4)
@@ -0,0 +1,59 @@
+import json
+
+from django.test import TestCase, override_settings
+
+from ads.models import VehicleAD
+from ads.tests.utils import IMAGE_URL
+from apis.constants import HttpStatusCodes
+
+
+class BatchReadTests(TestCase):
+    def setUp(self):
+        self.ids = {
+            state: VehicleAD.objects.create(image=IMAGE_URL, email='a@b.com', state=state, category='car').pk
+            for state in VehicleAD.StateAD.values
+        }
+
+    def get(self, *ids):
+        return self.client.get('/vehicle/ads/batch', {'ids': ids})
+
+    def test_each_id_answers_like_the_single_read(self):
+        missing = max(self.ids.values()) + 1
+        order = [self.ids['accepted'], self.ids['rejected'], self.ids['review'], self.ids['pending'], missing]
+
+        response = self.get(','.join(map(str, order)))
+
+        self.assertEqual(response.status_code, HttpStatusCodes.OK)
+        results = json.loads(response.content)['data']['ads']
+        self.assertEqual([result['id'] for result in results], order)
+        self.assertEqual(
+            [result['status_code'] for result in results],
+            [
+                HttpStatusCodes.OK,
+                HttpStatusCodes.FORBIDDEN,
+                HttpStatusCodes.NOT_FOUND,
+                HttpStatusCodes.NOT_FOUND,
+                HttpStatusCodes.NOT_FOUND,
+            ]
+        )
+        self.assertEqual(results[0]['ad']['id'], self.ids['accepted'])
+        self.assertTrue(all(result['ad'] is None for result in results[1:]))
+        for result in results:
+            single = self.client.get(f"/vehicle/ads/{result['id']}")
+            self.assertEqual(single.status_code, result['status_code'])
+
+    def test_repeated_ids_and_parameters(self):
+        accepted = self.ids['accepted']
+
+        response = self.get(f'{accepted},{accepted}', str(accepted))
+
+        self.assertEqual([result['id'] for result in json.loads(response.content)['data']['ads']], [accepted])
+
+    def test_invalid_ids(self):
+        self.assertEqual(self.get('1,x').status_code, HttpStatusCodes.BAD_REQUEST)
+        self.assertEqual(self.client.get('/vehicle/ads/batch').status_code, HttpStatusCodes.BAD_REQUEST)
+
+    @override_settings(BATCH_MAX_IDS=2)
+    def test_too_many_ids(self):
+        self.assertEqual(self.get('1,2').status_code, HttpStatusCodes.OK)
+        self.assertEqual(self.get('1,2,3').status_code, HttpStatusCodes.BAD_REQUEST)
@@ -0,0 +1,122 @@
+from unittest import mock
+
+import math
+import time
+
+import botocore.exceptions
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase
+
+from ads.models import VehicleAD
+from apis.breakers import _CircuitBreaker, CircuitOpenError, breakers
+from apis.clients import _ObjectStorageClient
+from apis.constants import HttpStatusCodes
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def breaker(self, **kwargs):
+        # breakers register themselves for /metrics; keep these out of it
+        name = f'test-{self.id()}'
+        self.addCleanup(breakers.pop, name, None)
+        return _CircuitBreaker(name, **kwargs)
+
+    def fail(self, breaker):
+        with self.assertRaises(ConnectionError):
+            with breaker:
+                raise ConnectionError("down")
+
+    def test_open_half_open_probe_closed(self):
+        breaker = self.breaker(failure_threshold=2, reset_timeout=0.05)
+
+        self.fail(breaker)
+        self.assertEqual(breaker.state, _CircuitBreaker.CLOSED)
+        self.fail(breaker)
+        self.assertEqual(breaker.state, _CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            with breaker:
+                pass
+
+        time.sleep(0.06)
+        self.assertEqual(breaker.state, _CircuitBreaker.HALF_OPEN)
+        with breaker:
+            # only one probe goes through while it is in flight
+            with self.assertRaises(CircuitOpenError):
+                with breaker:
+                    pass
+        self.assertEqual(breaker.state, _CircuitBreaker.CLOSED)
+        self.assertEqual(breaker.status()['consecutive_failures'], 0)
+
+    def test_failed_probe_opens_again(self):
+        breaker = self.breaker(failure_threshold=1, reset_timeout=0.05)
+        self.fail(breaker)
+
+        time.sleep(0.06)
+        self.fail(breaker)
+
+        self.assertEqual(breaker.state, _CircuitBreaker.OPEN)
+
+    def test_other_errors_do_not_count(self):
+        breaker = self.breaker(failure_threshold=1, reset_timeout=30)
+
+        with self.assertRaises(ValueError):
+            with breaker:
+                raise ValueError("bad image")
+
+        self.assertEqual(breaker.state, _CircuitBreaker.CLOSED)
+
+
+class ObjectStorageFailureTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch('apis.clients.boto3.resource')
+        self.addCleanup(patcher.stop)
+        self.s3 = patcher.start().return_value.meta.client
+        self.storage = _ObjectStorageClient(key='key', secret='secret', bucket='bucket', url='http://s3.local')
+
+    def client_error(self, status_code):
+        return botocore.exceptions.ClientError(
+            {'Error': {'Code': str(status_code)}, 'ResponseMetadata': {'HTTPStatusCode': status_code}},
+            'PutObject'
+        )
+
+    def test_5xx_means_unavailable(self):
+        self.s3.put_object.side_effect = self.client_error(503)
+
+        with self.assertRaises(ConnectionError):
+            self.storage.put(path='car.jpg', file=b'image')
+
+    def test_4xx_is_passed_on(self):
+        self.s3.put_object.side_effect = self.client_error(403)
+
+        with self.assertRaises(botocore.exceptions.ClientError):
+            self.storage.put(path='car.jpg', file=b'image')
+
+
+@mock.patch('apis.admission.admission_controller.is_overloaded', return_value=False)
+class StorageUnavailableTests(TestCase):
+    def post(self):
+        return self.client.post('/vehicle/ads/new', {
+            'email': 'a@b.com',
+            'description': 'submitted',
+            'image': SimpleUploadedFile('car.jpg', b'image', content_type='image/jpeg'),
+        })
+
+    @mock.patch('ads.views.object_storage')
+    def test_open_circuit_gives_its_retry_after(self, storage, _):
+        storage.put.side_effect = CircuitOpenError('storage', retry_after=12.3)
+
+        response = self.post()
+
+        self.assertEqual(response.status_code, HttpStatusCodes.SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '13')
+        self.assertFalse(VehicleAD.objects.exists())
+
+    @mock.patch('ads.views.object_storage')
+    def test_failed_call_waits_for_the_breaker(self, storage, _):
+        storage.put.side_effect = ConnectionError('storage is unavailable')
+
+        response = self.post()
+
+        self.assertEqual(response.status_code, HttpStatusCodes.SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], str(math.ceil(settings.CIRCUIT_BREAKER_RESET_TIMEOUT)))
@@ -0,0 +1,96 @@
+from unittest import mock
+
+import json
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from ads.models import VehicleAD, OutboxMessage
+from ads.tests.utils import IMAGE_URL, totals
+from apis.constants import HttpStatusCodes
+
+
+@mock.patch('apis.admission.admission_controller.is_overloaded', return_value=False)
+class BulkSubmissionTests(TestCase):
+    def post(self, count, image=b'image'):
+        return self.client.post('/vehicle/ads/bulk', {
+            'email': 'a@b.com',
+            'description': [f'ad {i}' for i in range(count)],
+            'image': [SimpleUploadedFile(f'car{i}.jpg', image, content_type='image/jpeg') for i in range(count)],
+        })
+
+    @mock.patch('ads.views.object_storage')
+    def test_all_stored(self, storage, _):
+        storage.put_many.return_value = [f'{IMAGE_URL}?{i}' for i in range(3)]
+
+        response = self.post(3)
+
+        self.assertEqual(response.status_code, HttpStatusCodes.CREATED)
+        results = json.loads(response.content)['data']['ads']
+        self.assertTrue(all(result['success'] for result in results))
+        self.assertEqual(sorted(result['id'] for result in results), sorted(VehicleAD.objects.values_list('pk', flat=True)))
+        # one validation per ad, one received email per request
+        self.assertEqual(OutboxMessage.objects.filter(kind=OutboxMessage.Kind.VALIDATION).count(), 3)
+        self.assertEqual(OutboxMessage.objects.filter(kind=OutboxMessage.Kind.RECEIVED_EMAIL).count(), 1)
+        self.assertEqual(totals(), {('review', ''): 3})
+
+    @mock.patch('ads.views.object_storage')
+    def test_some_stored(self, storage, _):
+        storage.put_many.return_value = [f'{IMAGE_URL}?0', ConnectionError('storage is unavailable'), f'{IMAGE_URL}?2']
+
+        response = self.post(3)
+
+        self.assertEqual(response.status_code, HttpStatusCodes.MULTI_STATUS)
+        results = json.loads(response.content)['data']['ads']
+        self.assertEqual([result['success'] for result in results], [True, False, True])
+        self.assertIsNone(results[1]['id'])
+        self.assertEqual(results[1]['messages'], ['Error: storage is unavailable'])
+        self.assertEqual(VehicleAD.objects.count(), 2)
+
+    @mock.patch('ads.views.object_storage')
+    def test_none_stored(self, storage, _):
+        storage.put_many.return_value = [ConnectionError('storage is unavailable')] * 2
+
+        response = self.post(2)
+
+        self.assertEqual(response.status_code, HttpStatusCodes.BAD_REQUEST)
+        self.assertFalse(any(result['success'] for result in json.loads(response.content)['data']['ads']))
+        self.assertEqual(VehicleAD.objects.count(), 0)
+
+    @mock.patch('ads.views.object_storage')
+    def test_description_per_image(self, storage, _):
+        response = self.client.post('/vehicle/ads/bulk', {
+            'email': 'a@b.com',
+            'description': ['only one'],
+            'image': [SimpleUploadedFile(f'car{i}.jpg', b'image') for i in range(2)],
+        })
+
+        self.assertEqual(response.status_code, HttpStatusCodes.BAD_REQUEST)
+        storage.put_many.assert_not_called()
+
+    @override_settings(BULK_MAX_ADS=2)
+    @mock.patch('ads.views.object_storage')
+    def test_too_many_ads(self, storage, _):
+        response = self.post(3)
+
+        self.assertEqual(response.status_code, HttpStatusCodes.BAD_REQUEST)
+        storage.put_many.assert_not_called()
+
+    @override_settings(UPLOAD_MAX_SIZE=5)
+    @mock.patch('ads.views.object_storage')
+    def test_oversized_images_are_not_uploaded(self, storage, _):
+        storage.put_many.return_value = [f'{IMAGE_URL}?0']
+
+        response = self.client.post('/vehicle/ads/bulk', {
+            'email': 'a@b.com',
+            'description': ['small', 'large'],
+            'image': [
+                SimpleUploadedFile('small.jpg', b'image', content_type='image/jpeg'),
+                SimpleUploadedFile('large.jpg', b'image' * 10, content_type='image/jpeg'),
+            ],
+        })
+
+        self.assertEqual(response.status_code, HttpStatusCodes.MULTI_STATUS)
+        self.assertEqual([name for name, _ in storage.put_many.call_args.kwargs['files']], ['small.jpg'])
+        results = json.loads(response.content)['data']['ads']
+        self.assertEqual([result['success'] for result in results], [True, False])
@@ -0,0 +1,77 @@
+from datetime import timedelta
+from email.utils import format_datetime
+from unittest import mock, skipUnless
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from apis.clients import _retry_after
+from apis.limiters import _TokenBucketLimiter, RateLimitExceeded
+
+try:
+    import fakeredis
+    import lupa  # noqa: F401 fakeredis runs the limiter's Lua script with it
+except ImportError:
+    fakeredis = None
+
+
+@skipUnless(fakeredis, "needs fakeredis and lupa")
+class TokenBucketLimiterTests(SimpleTestCase):
+    def setUp(self):
+        # whole seconds: the script keeps timestamps as Lua numbers, and a
+        # rounded fraction would refill a hair less than a full token
+        self.now = timezone.now().replace(day=15, microsecond=0)
+        patcher = mock.patch('apis.limiters.timezone')
+        self.addCleanup(patcher.stop)
+        patcher.start().now.side_effect = lambda: self.now
+
+    def limiter(self, **kwargs):
+        return _TokenBucketLimiter(fakeredis.FakeRedis(), name='test', **kwargs)
+
+    def test_burst_then_refill(self):
+        limiter = self.limiter(rate=2, capacity=3)
+
+        self.assertEqual([limiter.try_acquire()[0] for _ in range(4)], [True, True, True, False])
+        allowed, wait = limiter.try_acquire()
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 0.5, places=3)
+
+        self.now += timedelta(seconds=1)
+        self.assertEqual([limiter.try_acquire()[0] for _ in range(3)], [True, True, False])
+
+        # never refills past its capacity
+        self.now += timedelta(minutes=10)
+        self.assertEqual([limiter.try_acquire()[0] for _ in range(4)], [True, True, True, False])
+
+    def test_acquire_raises_instead_of_waiting_too_long(self):
+        limiter = self.limiter(rate=0.1, capacity=1)
+        limiter.acquire()
+
+        with self.assertRaises(RateLimitExceeded) as raised:
+            limiter.acquire(max_wait=1)
+        self.assertAlmostEqual(raised.exception.retry_after, 10, places=3)
+
+    def test_monthly_quota(self):
+        limiter = self.limiter(rate=100, capacity=100, monthly_quota=2)
+
+        self.assertEqual([limiter.try_acquire()[0] for _ in range(3)], [True, True, False])
+        self.assertEqual(limiter.status()['remaining_monthly_quota'], 0)
+
+        # the quota starts over with the next month
+        self.now += timedelta(days=31)
+        self.assertTrue(limiter.try_acquire()[0])
+
+
+class RetryAfterTests(SimpleTestCase):
+    def test_seconds(self):
+        self.assertEqual(_retry_after('120'), 120)
+        self.assertEqual(_retry_after('-5'), 0)
+
+    def test_http_date(self):
+        when = timezone.now() + timedelta(seconds=90)
+        self.assertAlmostEqual(_retry_after(format_datetime(when, usegmt=True)), 90, delta=2)
+
+    def test_missing_or_garbage_falls_back(self):
+        self.assertEqual(_retry_after(None, default=3), 3)
+        self.assertEqual(_retry_after('soon', default=3), 3)
+        self.assertEqual(_retry_after('inf', default=3), 3)
@@ -0,0 +1,122 @@
+import json
+import asyncio
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from ads.models import VehicleAD
+from ads.tests.utils import IMAGE_URL
+from apis.constants import HttpStatusCodes
+from apis.notifications import _ModerationListener, publish_moderation
+
+try:
+    import fakeredis
+    import fakeredis.aioredis
+except ImportError:
+    fakeredis = None
+
+
+class WsgiWaitTests(SimpleTestCase):
+    def test_refused_without_a_long_poll_server(self):
+        response = self.client.get('/vehicle/ads/1/wait')
+
+        self.assertEqual(response.status_code, HttpStatusCodes.MISDIRECTED_REQUEST)
+
+    @override_settings(LONG_POLL_URL='http://poll.example.com:8001/')
+    def test_redirected_to_the_long_poll_server(self):
+        response = self.client.get('/vehicle/ads/1/wait', {'timeout': 5})
+
+        self.assertEqual(response.status_code, HttpStatusCodes.TEMPORARY_REDIRECT)
+        self.assertEqual(response['Location'], 'http://poll.example.com:8001/vehicle/ads/1/wait?timeout=5')
+
+
+@skipUnless(fakeredis, "needs fakeredis")
+class AsgiWaitTests(TransactionTestCase):
+    # the view reads the ad from a connection of its own, so the ads have
+    # to be committed
+    def setUp(self):
+        server = fakeredis.FakeServer()
+        self.redis = fakeredis.FakeRedis(server=server)
+        patchers = [
+            mock.patch(
+                'apis.notifications.redis.asyncio.Redis.from_url',
+                side_effect=lambda *args, **kwargs: fakeredis.aioredis.FakeRedis(server=server)
+            ),
+            mock.patch('apis.notifications.redis_client', self.redis),
+            mock.patch('ads.views.moderation_listener', _ModerationListener('redis://', settings.MODERATION_CHANNEL)),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.listener = patchers[-1].new
+
+    async def stop_listeners(self):
+        # each test runs on an event loop of its own, which starts a listener
+        for listener in list(self.listener._listeners.values()):
+            listener._task.cancel()
+            try:
+                await listener._task
+            except asyncio.CancelledError:
+                pass
+
+    async def create(self, state):
+        return await sync_to_async(VehicleAD.objects.create)(
+            image=IMAGE_URL, email='a@b.com', state=state, category='car'
+        )
+
+    async def wait(self, ad_id, timeout):
+        try:
+            return await self.async_client.get(f'/vehicle/ads/{ad_id}/wait', {'timeout': timeout})
+        finally:
+            await self.stop_listeners()
+
+    async def subscribed(self, ad_id):
+        # the listener wakes everyone once its subscription is up; wait for
+        # the waiter to come back after that
+        while not self.redis.pubsub_numsub(settings.MODERATION_CHANNEL)[0][1]:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.1)
+        while not any(ad_id in listener._waiters for listener in self.listener._listeners.values()):
+            await asyncio.sleep(0.01)
+
+    async def test_woken_by_the_decision(self):
+        ad = await self.create(VehicleAD.StateAD.REVIEW)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+
+        async def decide():
+            await self.subscribed(ad.pk)
+            ad.state = VehicleAD.StateAD.ACCEPTED
+            await sync_to_async(ad.save)()
+            publish_moderation(ad.pk, ad.state)
+
+        response, _ = await asyncio.gather(self.wait(ad.pk, 30), decide())
+
+        self.assertEqual(response.status_code, HttpStatusCodes.OK)
+        self.assertEqual(json.loads(response.content)['data']['ad']['id'], ad.pk)
+        self.assertLess(loop.time() - started, 10)
+
+    async def test_decided_ad_returns_at_once(self):
+        ad = await self.create(VehicleAD.StateAD.REJECTED)
+
+        response = await self.wait(ad.pk, 30)
+
+        self.assertEqual(response.status_code, HttpStatusCodes.FORBIDDEN)
+
+    async def test_times_out_while_under_review(self):
+        ad = await self.create(VehicleAD.StateAD.REVIEW)
+
+        response = await self.wait(ad.pk, 0.2)
+
+        self.assertEqual(response.status_code, HttpStatusCodes.NOT_FOUND)
+
+    async def test_invalid_requests(self):
+        ad = await self.create(VehicleAD.StateAD.REVIEW)
+
+        response = await self.async_client.get(f'/vehicle/ads/{ad.pk}/wait', {'timeout': settings.LONG_POLL_MAX_TIMEOUT + 1})
+        self.assertEqual(response.status_code, HttpStatusCodes.BAD_REQUEST)
+        response = await self.async_client.post(f'/vehicle/ads/{ad.pk}/wait')
+        self.assertEqual(response.status_code, HttpStatusCodes.METHOD_NOT_ALLOWED)
@@ -0,0 +1,113 @@
+from unittest import mock
+
+import json
+import re
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from ads.models import VehicleAD, ModerationTotal, ModerationStat
+from ads.stats import rebuild_moderation_stats
+from ads.tests.utils import IMAGE_URL, totals, today
+from apis.constants import HttpStatusCodes
+
+
+@mock.patch('apis.admission.admission_controller.is_overloaded', return_value=False)
+class ModerationCounterTests(TestCase):
+    def test_counters_follow_an_ad_through_its_life(self, _):
+        storage = mock.Mock()
+        storage.put.return_value = IMAGE_URL
+        storage.presign_upload.return_value = {'url': IMAGE_URL, 'post': {}, 'put': {}}
+        storage.head.return_value = {'size': 10, 'content_type': 'image/jpeg'}
+
+        with mock.patch('ads.views.object_storage', storage):
+            response = self.client.post('/vehicle/ads/new', {
+                'email': 'a@b.com',
+                'description': 'submitted',
+                'image': SimpleUploadedFile('car.jpg', b'image', content_type='image/jpeg'),
+            })
+            self.assertEqual(response.status_code, HttpStatusCodes.CREATED)
+            self.assertEqual(totals(), {('review', ''): 1})
+
+            response = self.client.post('/vehicle/ads/uploads', {
+                'email': 'a@b.com',
+                'description': 'uploaded',
+                'filename': 'car.jpg',
+                'content_type': 'image/jpeg',
+                'size': '10',
+            })
+            self.assertEqual(response.status_code, HttpStatusCodes.CREATED)
+            self.assertEqual(totals(), {('review', ''): 1, ('pending', ''): 1})
+
+            ad_id = json.loads(response.content)['data']['ad_id']
+            response = self.client.post(f'/vehicle/ads/{ad_id}/finalize')
+            self.assertEqual(response.status_code, HttpStatusCodes.ACCEPTED)
+            self.assertEqual(totals(), {('review', ''): 2})
+
+        accepted, rejected = VehicleAD.objects.order_by('pk')
+        accepted.transition(VehicleAD.StateAD.REVIEW, VehicleAD.StateAD.ACCEPTED, category='car')
+        rejected.transition(VehicleAD.StateAD.REVIEW, VehicleAD.StateAD.REJECTED, category=None)
+        self.assertEqual(totals(), {('accepted', 'car'): 1, ('rejected', ''): 1})
+        self.assertEqual(
+            today(),
+            {('review', ''): 2, ('pending', ''): 1, ('accepted', 'car'): 1, ('rejected', ''): 1}
+        )
+
+        # the live counters agree with a rebuild from the ads table
+        call_command('rebuild_moderation_stats', stdout=mock.Mock())
+        self.assertEqual(totals(), {('accepted', 'car'): 1, ('rejected', ''): 1})
+
+    def test_rebuild_counts_ads_the_counters_never_saw(self, _):
+        # what the backfill migration finds: ads from before the counters
+        VehicleAD.objects.bulk_create([
+            VehicleAD(image=IMAGE_URL, email='a@b.com'),
+            VehicleAD(image=IMAGE_URL, email='a@b.com'),
+            VehicleAD(image=IMAGE_URL, email='a@b.com', state=VehicleAD.StateAD.ACCEPTED, category='car',
+                      moderated_at=timezone.now()),
+        ])
+        self.assertEqual(totals(), {})
+
+        rebuild_moderation_stats()
+        self.assertEqual(totals(), {('review', ''): 2, ('accepted', 'car'): 1})
+
+        # deciding one of them no longer takes review below zero
+        VehicleAD.objects.filter(state=VehicleAD.StateAD.REVIEW).first().transition(
+            VehicleAD.StateAD.REVIEW, VehicleAD.StateAD.REJECTED, category=None
+        )
+        self.assertEqual(totals(), {('review', ''): 1, ('accepted', 'car'): 1, ('rejected', ''): 1})
+
+
+class SlotSumTests(TestCase):
+    def setUp(self):
+        # a single slot can be negative, only the sum means anything
+        ModerationTotal.objects.bulk_create([
+            ModerationTotal(state='review', category='', slot=0, count=5),
+            ModerationTotal(state='review', category='', slot=3, count=-2),
+            ModerationTotal(state='accepted', category='car', slot=1, count=4),
+        ])
+        ModerationStat.objects.bulk_create([
+            ModerationStat(day=timezone.now().date(), state='review', category='', slot=0, count=5),
+            ModerationStat(day=timezone.now().date(), state='review', category='', slot=2, count=1),
+        ])
+
+    def test_stats_endpoint(self):
+        response = self.client.get('/vehicle/ads/stats', {'days': 1})
+
+        self.assertEqual(response.status_code, HttpStatusCodes.OK)
+        data = json.loads(response.content)['data']
+        self.assertEqual(data['totals'], {'review': {'': 3}, 'accepted': {'car': 4}})
+        self.assertEqual([(row['state'], row['count']) for row in data['daily']], [('review', 6)])
+
+    def test_admin_lists_one_row_per_counter(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@b.com', 'admin'))
+
+        for url, expected in (
+            ('/admin/ads/moderationtotal/', ['4', '3']),
+            ('/admin/ads/moderationstat/', ['6']),
+        ):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, HttpStatusCodes.OK)
+            self.assertEqual(re.findall(r'<td class="field-total">(-?\d+)</td>', response.content.decode()), expected)
@@ -0,0 +1,60 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from ads.models import VehicleAD, OutboxMessage
+from ads.outbox import relay_batch
+from ads.tests.utils import IMAGE_URL
+
+
+class RelayTests(TestCase):
+    def setUp(self):
+        self.mocks = {}
+        for name in ('rabbitmq', 'fair_scheduler', 'validate_ad', 'send_received_email', 'send_success_email'):
+            patcher = mock.patch(f'ads.outbox.{name}')
+            self.mocks[name] = patcher.start()
+            self.addCleanup(patcher.stop)
+        self.mocks['fair_scheduler'].tenant.side_effect = str.lower
+        self.mocks['fair_scheduler'].admit.side_effect = lambda tenant, count: [4] * count
+
+    def submit(self, email, count):
+        ads = [VehicleAD.objects.create(image=IMAGE_URL, email=email) for _ in range(count)]
+        OutboxMessage.for_submission(ads)
+        return [str(ad.pk) for ad in ads]
+
+    def test_publishes_then_deletes(self):
+        dealer = self.submit('Dealer@b.com', 2)
+        single = self.submit('single@b.com', 1)
+        accepted = VehicleAD.objects.create(image=IMAGE_URL, email='a@b.com', state=VehicleAD.StateAD.ACCEPTED)
+        OutboxMessage.for_decision(accepted)
+
+        self.assertEqual(relay_batch(100), 6)
+
+        rabbitmq = self.mocks['rabbitmq']
+        rabbitmq.put_many.assert_has_calls([
+            mock.call(dealer, tenant='dealer@b.com', priorities=[4, 4]),
+            mock.call(single, tenant='single@b.com', priorities=[4]),
+        ], any_order=True)
+        self.assertEqual(self.mocks['send_received_email'].delay.call_count, 2)
+        self.mocks['send_success_email'].delay.assert_called_once_with('a@b.com', accepted.pk)
+        self.mocks['validate_ad'].delay.assert_called_once_with()
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_failed_publish_rolls_the_batch_back(self):
+        self.submit('dealer@b.com', 3)
+        self.mocks['rabbitmq'].put_many.side_effect = ConnectionError('Connection to rabbitmq failed')
+
+        with self.assertRaises(ConnectionError):
+            relay_batch(100)
+
+        # still there for the next round, and not counted as pending twice
+        self.assertEqual(OutboxMessage.objects.count(), 4)
+        self.mocks['fair_scheduler'].done.assert_called_once_with('dealer@b.com', count=3)
+        self.mocks['validate_ad'].delay.assert_not_called()
+
+    def test_batch_size(self):
+        self.submit('dealer@b.com', 3)
+
+        self.assertEqual(relay_batch(2), 2)
+        self.assertEqual(relay_batch(2), 2)
+        self.assertEqual(relay_batch(2), 0)
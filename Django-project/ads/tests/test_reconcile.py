@@ -0,0 +1,61 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from ads.models import VehicleAD, ArchivedVehicleAD
+
+
+class ReconcileBucketTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch('ads.management.commands.reconcile_bucket.object_storage')
+        self.addCleanup(patcher.stop)
+        self.storage = patcher.start()
+        self.storage.path_from_url.side_effect = lambda url: url.rsplit('/', 1)[1]
+        self.storage.delete_many.return_value = []
+
+        day_old = timezone.now() - timedelta(hours=24)
+        just_now = timezone.now()
+        self.storage.list_objects.return_value = [
+            [self.item('ad.jpg', day_old), self.item('orphan.jpg', day_old)],
+            [self.item('archived.jpg', day_old), self.item('uploading.jpg', just_now)],
+        ]
+        VehicleAD.objects.create(image='https://bucket.example.com/ad.jpg', email='a@b.com')
+        ArchivedVehicleAD.objects.create(
+            id=1000,
+            image='https://bucket.example.com/archived.jpg',
+            email='a@b.com',
+            state=VehicleAD.StateAD.REJECTED,
+            created_at=day_old,
+            reason=ArchivedVehicleAD.Reason.REJECTED,
+        )
+
+    def item(self, path, last_modified):
+        return {'path': path, 'size': 10, 'last_modified': last_modified}
+
+    def reconcile(self, grace_hours=1, **options):
+        out = StringIO()
+        call_command('reconcile_bucket', grace_hours=grace_hours, stdout=out, **options)
+        return out.getvalue()
+
+    def test_reports_orphans_older_than_the_grace_period(self):
+        out = self.reconcile()
+
+        # referenced, still archive_ads' to delete, or possibly mid-upload
+        self.assertEqual([line.split('\t')[0] for line in out.splitlines()[:-1]], ['orphan.jpg'])
+        self.assertIn('2 images referenced, 4 objects scanned, 1 orphans (10 bytes), 0 deleted', out)
+        self.storage.delete_many.assert_not_called()
+
+    def test_deletes_only_when_asked(self):
+        out = self.reconcile(delete=True, quiet=True)
+
+        self.storage.delete_many.assert_called_once_with(['orphan.jpg'])
+        self.assertIn('1 orphans (10 bytes), 1 deleted', out)
+
+    def test_the_grace_period_is_configurable(self):
+        out = self.reconcile(grace_hours=48, quiet=True)
+
+        self.assertIn('0 orphans', out)
@@ -0,0 +1,70 @@
+from unittest import mock
+
+from django.conf import settings
+
+from ads import tasks
+from ads.tests.utils import BrokerTestCase
+from apis.breakers import CircuitOpenError
+
+
+class RetryTierTests(BrokerTestCase):
+    def test_attempts_walk_up_the_tiers(self):
+        self.assertEqual([self.rabbitmq.retry('1', attempt) for attempt in (1, 2, 3, 4, 9)], [10, 60, 300, 1800, 1800])
+        self.assertEqual([headers['x-attempt'] for _, headers in self.messages('test.retry.1800s')], [4, 9])
+
+    def test_a_requested_delay_rounds_up_to_a_tier(self):
+        self.assertEqual(self.rabbitmq.retry('1', 0, delay=45), 60)
+        self.assertEqual(self.rabbitmq.retry('1', 0, delay=10), 10)
+        self.assertEqual(self.rabbitmq.retry('1', 0, delay=5000), 1800)
+
+
+@mock.patch('ads.tasks.admission_controller', mock.Mock())
+@mock.patch.object(tasks.validate_ad, 'apply_async')
+class ValidationFailureTests(BrokerTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch('ads.tasks.rabbitmq', self.rabbitmq)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def validate(self, attempt, error):
+        self.rabbitmq.put('1', attempt=attempt)
+        with mock.patch.object(tasks, '__validate', side_effect=error):
+            tasks.validate_ad()
+
+    def assertSettled(self):
+        # acked or given back, never left hanging on the channel
+        self.assertFalse(self.rabbitmq._delivery_channel._unacked)
+
+    def test_failure_counts_an_attempt(self, apply_async):
+        self.validate(1, RuntimeError('broken image'))
+
+        [(ad_id, headers)] = self.messages('test.retry.60s')
+        self.assertEqual((ad_id, headers['x-attempt']), ('1', 2))
+        apply_async.assert_called_once_with(countdown=60)
+        self.assertSettled()
+
+    def test_parked_after_the_last_attempt(self, apply_async):
+        self.validate(settings.RABBITMQ_MAX_ATTEMPTS - 1, RuntimeError('broken image'))
+
+        [(ad_id, headers)] = self.messages('test.dead')
+        self.assertEqual(headers['x-attempt'], settings.RABBITMQ_MAX_ATTEMPTS)
+        self.assertIn('broken image', headers['x-reason'])
+        self.assertFalse(any(self.broker.queues[f'test.retry.{delay}s'] for delay in (10, 60, 300, 1800)))
+        apply_async.assert_not_called()
+        self.assertSettled()
+
+    def test_outage_keeps_the_attempt(self, apply_async):
+        self.validate(2, ConnectionError('imagga is down'))
+
+        [(_, headers)] = self.messages('test.retry.60s')
+        self.assertEqual(headers['x-attempt'], 2)
+        self.assertSettled()
+
+    def test_failed_retry_gives_the_message_back(self, apply_async):
+        with mock.patch.object(self.rabbitmq, 'retry', side_effect=CircuitOpenError('rabbitmq', retry_after=5)):
+            with self.assertRaises(CircuitOpenError):
+                self.validate(1, RuntimeError('broken image'))
+
+        self.assertEqual([ad_id for ad_id, _ in self.messages('test')], ['1'])
+        self.assertSettled()
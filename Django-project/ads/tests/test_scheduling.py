@@ -0,0 +1,93 @@
+from unittest import mock, skipUnless
+
+from django.test import SimpleTestCase
+
+from ads import tasks
+from ads.tests.utils import BrokerTestCase
+from apis.scheduling import _FairScheduler
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+@skipUnless(fakeredis, "needs fakeredis")
+class FairSchedulerTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1_000_000.0
+        patcher = mock.patch('apis.scheduling.time.time', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def scheduler(self, **kwargs):
+        return _FairScheduler(fakeredis.FakeRedis(), max_priority=4, default_concurrency=2, **kwargs)
+
+    def test_leases_are_capped_per_submitter(self):
+        scheduler = self.scheduler()
+
+        first, second = scheduler.acquire('dealer'), scheduler.acquire('dealer')
+        self.assertIsNone(scheduler.acquire('dealer'))
+        # other submitters have slots of their own
+        self.assertIsNotNone(scheduler.acquire('someone'))
+
+        scheduler.release('dealer', first)
+        self.assertIsNotNone(scheduler.acquire('dealer'))
+        self.assertIsNotNone(second)
+
+    def test_leases_of_dead_workers_run_out(self):
+        scheduler = self.scheduler(inflight_ttl=60)
+        scheduler.acquire('dealer')
+        scheduler.acquire('dealer')
+
+        self.now += 61
+
+        self.assertIsNotNone(scheduler.acquire('dealer'))
+
+    def test_per_submitter_limits(self):
+        scheduler = self.scheduler(concurrency={'Dealer': 1, 'unlimited': 0})
+
+        self.assertIsNotNone(scheduler.acquire('dealer'))
+        self.assertIsNone(scheduler.acquire('dealer'))
+        self.assertTrue(all(scheduler.acquire('unlimited') for _ in range(10)))
+
+    def test_priority_drops_as_the_backlog_doubles(self):
+        scheduler = self.scheduler()
+
+        self.assertEqual(scheduler.admit('single'), [4])
+        self.assertEqual(scheduler.admit('dealer', count=8), [4, 3, 3, 2, 2, 2, 2, 1])
+
+        scheduler.done('dealer', count=8)
+        self.assertEqual(scheduler.admit('dealer'), [4])
+        # more done than admitted does not buy a head start
+        scheduler.done('single', count=5)
+        self.assertEqual(scheduler.admit('single', count=2), [4, 3])
+
+
+@skipUnless(fakeredis, "needs fakeredis")
+@mock.patch('ads.tasks.admission_controller', mock.Mock())
+@mock.patch.object(tasks.validate_ad, 'apply_async')
+class DeferralTests(BrokerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.scheduler = _FairScheduler(fakeredis.FakeRedis(), max_priority=0, default_concurrency=1)
+        for target, value in (('ads.tasks.rabbitmq', self.rabbitmq), ('ads.tasks.fair_scheduler', self.scheduler)):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @mock.patch.object(tasks, '__validate')
+    def test_capped_submitter_waits_its_turn(self, validate, apply_async):
+        # the dealer already has its one validation in flight
+        self.scheduler.acquire('dealer')
+        self.rabbitmq.put('1', attempt=2, tenant='dealer')
+        self.rabbitmq.put('2', tenant='someone')
+
+        tasks.validate_ad()
+
+        validate.assert_called_once_with(2)
+        [(ad_id, headers)] = self.messages('test')
+        self.assertEqual((ad_id, headers['x-attempt'], headers['x-tenant']), ('1', 2, 'dealer'))
+        # only capped submitters left: check back shortly instead of spinning
+        apply_async.assert_called_once_with(countdown=1)
+        self.assertFalse(self.rabbitmq._delivery_channel._unacked)
@@ -0,0 +1,89 @@
+from unittest import mock, skipUnless
+
+import redis
+from celery.signals import worker_process_shutdown, worker_shutdown
+
+from django.test import SimpleTestCase
+
+from apis.sharding import _ShardCoordinator
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+class _Consumer(_ShardCoordinator):
+    # several consumers in one process; the real id is host:pid
+    def __init__(self, consumer_id, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._consumer_id = consumer_id
+
+    @property
+    def consumer_id(self):
+        return self._consumer_id
+
+
+@skipUnless(fakeredis, "needs fakeredis")
+class ShardAssignmentTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1_000_000.0
+        patcher = mock.patch('apis.sharding.time.time', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.redis = fakeredis.FakeRedis()
+
+    def consumer(self, consumer_id):
+        return _Consumer(consumer_id, self.redis, name='test', shards=4, heartbeat_interval=10)
+
+    def heartbeat(self):
+        self.now += 10
+
+    def test_a_lone_consumer_takes_every_shard(self):
+        self.assertEqual(self.consumer('a').assigned(), [0, 1, 2, 3])
+
+    def test_shards_are_split_when_a_consumer_joins(self):
+        a, b = self.consumer('a'), self.consumer('b')
+        a.assigned()
+        self.assertEqual(b.assigned(), [1, 3])
+
+        self.heartbeat()
+
+        self.assertEqual(a.assigned(), [0, 2])
+        self.assertEqual(a.shard_order(), [0, 2, 1, 3])
+
+    def test_shards_move_back_when_a_consumer_leaves(self):
+        a, b = self.consumer('a'), self.consumer('b')
+        a.assigned()
+        b.assigned()
+
+        b.leave()
+        self.heartbeat()
+
+        self.assertEqual(a.assigned(), [0, 1, 2, 3])
+
+    def test_a_dead_consumer_drops_out_on_its_third_missed_heartbeat(self):
+        a, b = self.consumer('a'), self.consumer('b')
+        b.assigned()
+        for _ in range(2):
+            self.heartbeat()
+            self.assertEqual(a.assigned(), [0, 2])
+
+        self.heartbeat()
+
+        self.assertEqual(a.assigned(), [0, 1, 2, 3])
+
+    def test_without_redis_every_consumer_takes_every_shard(self):
+        broken = mock.Mock()
+        broken.pipeline.return_value.execute.side_effect = redis.ConnectionError('down')
+
+        self.assertEqual(_Consumer('a', broken, name='test', shards=4).assigned(), [0, 1, 2, 3])
+
+
+class WorkerShutdownTests(SimpleTestCase):
+    @mock.patch('apis.clients.rabbitmq')
+    def test_both_shutdown_signals_leave_the_ring(self, rabbitmq):
+        worker_shutdown.send(sender=None)
+        worker_process_shutdown.send(sender=None, pid=1, exitcode=0)
+
+        self.assertEqual(rabbitmq.leave_shards.call_count, 2)
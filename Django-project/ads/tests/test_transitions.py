@@ -0,0 +1,41 @@
+from django.test import TestCase
+
+from ads.models import VehicleAD
+from ads.tests.utils import IMAGE_URL, totals
+
+
+class TransitionTests(TestCase):
+    def test_moves_the_ad_and_bumps_its_version(self):
+        ad = VehicleAD.objects.create(image=IMAGE_URL, email='a@b.com')
+
+        self.assertTrue(ad.transition(VehicleAD.StateAD.REVIEW, VehicleAD.StateAD.ACCEPTED, category='car'))
+
+        ad.refresh_from_db()
+        self.assertEqual(ad.state, VehicleAD.StateAD.ACCEPTED)
+        self.assertEqual(ad.category, 'car')
+        self.assertEqual(ad.version, 1)
+
+    def test_stale_version_loses_and_writes_nothing(self):
+        ad = VehicleAD.objects.create(image=IMAGE_URL, email='a@b.com')
+        stale = VehicleAD.objects.get(pk=ad.pk)
+        self.assertTrue(ad.transition(VehicleAD.StateAD.REVIEW, VehicleAD.StateAD.ACCEPTED, category='car'))
+        before = totals()
+
+        self.assertFalse(stale.transition(VehicleAD.StateAD.REVIEW, VehicleAD.StateAD.REJECTED, category=None))
+
+        ad.refresh_from_db()
+        self.assertEqual(ad.state, VehicleAD.StateAD.ACCEPTED)
+        self.assertEqual(ad.category, 'car')
+        self.assertEqual(ad.version, 1)
+        self.assertEqual(stale.state, VehicleAD.StateAD.REVIEW)
+        self.assertEqual(totals(), before)
+
+    def test_stale_state_loses_and_writes_nothing(self):
+        ad = VehicleAD.objects.create(image=IMAGE_URL, email='a@b.com', state=VehicleAD.StateAD.PENDING)
+
+        self.assertFalse(ad.transition(VehicleAD.StateAD.REVIEW, VehicleAD.StateAD.ACCEPTED, category='car'))
+
+        ad.refresh_from_db()
+        self.assertEqual(ad.state, VehicleAD.StateAD.PENDING)
+        self.assertEqual(ad.version, 0)
+        self.assertEqual(totals(), {})
@@ -0,0 +1,65 @@
+from unittest import mock
+
+import json
+
+from django.test import TestCase
+
+from ads.models import VehicleAD, OutboxMessage
+from ads.tests.utils import IMAGE_URL
+from apis.constants import HttpStatusCodes
+
+
+@mock.patch('apis.admission.admission_controller.is_overloaded', return_value=False)
+class DirectUploadTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch('ads.views.object_storage')
+        self.addCleanup(patcher.stop)
+        self.storage = patcher.start()
+        self.storage.presign_upload.return_value = {'url': IMAGE_URL, 'post': {}, 'put': {}}
+        self.storage.head.return_value = {'size': 10, 'content_type': 'image/jpeg'}
+
+    def upload(self):
+        response = self.client.post('/vehicle/ads/uploads', {
+            'email': 'a@b.com',
+            'description': 'uploaded',
+            'filename': 'car.jpg',
+            'content_type': 'image/jpeg',
+            'size': '10',
+        })
+        self.assertEqual(response.status_code, HttpStatusCodes.CREATED)
+        return json.loads(response.content)['data']['ad_id']
+
+    def finalize(self, ad_id):
+        return self.client.post(f'/vehicle/ads/{ad_id}/finalize')
+
+    def test_pending_until_finalized(self, _):
+        ad_id = self.upload()
+        self.assertEqual(VehicleAD.objects.get(pk=ad_id).state, VehicleAD.StateAD.PENDING)
+        self.assertFalse(OutboxMessage.objects.exists())
+
+        self.assertEqual(self.finalize(ad_id).status_code, HttpStatusCodes.ACCEPTED)
+
+        self.assertEqual(VehicleAD.objects.get(pk=ad_id).state, VehicleAD.StateAD.REVIEW)
+        self.assertEqual(OutboxMessage.objects.filter(kind=OutboxMessage.Kind.VALIDATION).count(), 1)
+        # a second finalize neither queues the ad again nor fails silently
+        self.assertEqual(self.finalize(ad_id).status_code, HttpStatusCodes.CONFLICT)
+        self.assertEqual(OutboxMessage.objects.filter(kind=OutboxMessage.Kind.VALIDATION).count(), 1)
+
+    def test_image_not_uploaded_yet(self, _):
+        ad_id = self.upload()
+        self.storage.head.return_value = None
+
+        self.assertEqual(self.finalize(ad_id).status_code, HttpStatusCodes.BAD_REQUEST)
+        self.assertEqual(VehicleAD.objects.get(pk=ad_id).state, VehicleAD.StateAD.PENDING)
+
+    def test_uploaded_image_is_checked(self, _):
+        ad_id = self.upload()
+
+        with self.settings(UPLOAD_MAX_SIZE=5):
+            self.assertEqual(self.finalize(ad_id).status_code, HttpStatusCodes.BAD_REQUEST)
+        self.storage.head.return_value = {'size': 10, 'content_type': 'text/html'}
+        self.assertEqual(self.finalize(ad_id).status_code, HttpStatusCodes.BAD_REQUEST)
+        self.assertEqual(VehicleAD.objects.get(pk=ad_id).state, VehicleAD.StateAD.PENDING)
+
+    def test_unknown_ad(self, _):
+        self.assertEqual(self.finalize(404).status_code, HttpStatusCodes.NOT_FOUND)
@@ -1,8 +1,23 @@
 from django.urls import path
-from .views import new_vehicle_ad, get_vehicle_ad
+from .views import (
+    new_vehicle_ad,
+    new_vehicle_ads_bulk,
+    new_vehicle_ad_upload,
+    finalize_vehicle_ad,
+    get_vehicle_ad,
+    get_moderation_stats,
+    get_vehicle_ads_batch,
+    wait_for_vehicle_ad,
+)
 
 app_name = 'ads'
 urlpatterns = [
     path('ads/new', new_vehicle_ad, name='new_vehicle_ad'),
+    path('ads/bulk', new_vehicle_ads_bulk, name='new_vehicle_ads_bulk'),
+    path('ads/uploads', new_vehicle_ad_upload, name='new_vehicle_ad_upload'),
+    path('ads/stats', get_moderation_stats, name='get_moderation_stats'),
+    path('ads/batch', get_vehicle_ads_batch, name='get_vehicle_ads_batch'),
+    path('ads/<int:ad_id>/finalize', finalize_vehicle_ad, name='finalize_vehicle_ad'),
+    path('ads/<int:ad_id>/wait', wait_for_vehicle_ad, name='wait_for_vehicle_ad'),
     path('ads/<int:ad_id>', get_vehicle_ad, name='get_vehicle_ad'),
 ]
\ No newline at end of file
@@ -1,43 +1,62 @@
+from django.http import HttpResponseNotAllowed
+from django.core.handlers.asgi import ASGIRequest
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
 
-from ads.models import VehicleAD
-from ads.tasks import (
-    validate_ad,
-    send_received_email,
+from datetime import timedelta
+
+import math
+import asyncio
+
+from asgiref.sync import sync_to_async
+
+from ads.models import (
+    VehicleAD,
+    OutboxMessage,
+    ModerationTotal,
+    ModerationStat,
+    record_moderation,
 )
 
 from apis.responses import ApiResponse
 from apis.constants import HttpStatusCodes
-from apis.clients import (
-    object_storage,
-    rabbitmq
-)
+from apis.admission import admission_control
+from apis.db_routing import read_from_replica
+from apis.metrics import track_stage, ADS_SUBMITTED
+from apis.clients import object_storage
+from apis.notifications import moderation_listener
 
 # Create your views here.
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@admission_control
 def new_vehicle_ad(request):
     try:
-        __check_keys(request)
-        __check_image_file(request)
+        with track_stage('multipart_parse'):
+            __check_keys(request)
+            __check_image_file(request)
         
-        path = object_storage.put(
-            path=request.FILES['image'].name,
-            file=request.FILES['image'].read(),
-            hash_path=True
-        )
-        
-        new_ad = VehicleAD()
-        new_ad.image = path
-        new_ad.email = request.POST['email']
-        new_ad.description = request.POST['description']
-        new_ad.save()
+        with track_stage('storage_put'):
+            path = object_storage.put(
+                path=request.FILES['image'].name,
+                file=request.FILES['image'],
+                hash_path=True
+            )
         
-        rabbitmq.put(str(new_ad.pk))
-        send_received_email.delay(request.POST['email'])
-        validate_ad.delay()
+        with track_stage('db_insert'), transaction.atomic():
+            new_ad = VehicleAD()
+            new_ad.image = path
+            new_ad.email = request.POST['email']
+            new_ad.description = request.POST['description']
+            new_ad.save()
+            OutboxMessage.for_submission([new_ad])
+            record_moderation(new_ad.state)
+        ADS_SUBMITTED.inc()
 
         return ApiResponse(
             status_code=HttpStatusCodes.CREATED,
@@ -45,6 +64,15 @@ def new_vehicle_ad(request):
                 'your ad has been received.check your email. we will notify you when it is accepted or rejected.'
             ]
         ).response()
+
+    except ConnectionError as e:
+        response = ApiResponse(
+            success=False,
+            status_code=HttpStatusCodes.SERVICE_UNAVAILABLE,
+            messages=[f"Error: {e}",]
+        ).response()
+        response['Retry-After'] = __retry_after(e)
+        return response
         
     except Exception as e:
         return ApiResponse(
@@ -54,30 +82,183 @@ def new_vehicle_ad(request):
         ).response()
 
 
-@require_http_methods(["GET"])
-def get_vehicle_ad(request, ad_id):
+@csrf_exempt
+@require_http_methods(["POST"])
+@admission_control
+def new_vehicle_ads_bulk(request):
     try:
-        ad = VehicleAD.objects.get(pk=ad_id)
+        with track_stage('multipart_parse'):
+            __check_keys(request)
+            images = request.FILES.getlist('image')
+            descriptions = request.POST.getlist('description')
+            if not images:
+                raise Exception("Missing image file")
+            if len(images) != len(descriptions):
+                raise Exception("every image needs exactly one description")
+            if len(images) > settings.BULK_MAX_ADS:
+                raise Exception(f"at most {settings.BULK_MAX_ADS} ads can be posted at once")
+
+        results = [{'index': i, 'success': False, 'id': None, 'messages': []} for i in range(len(images))]
+        uploads = []
+        for i, image in enumerate(images):
+            if image.size > settings.UPLOAD_MAX_SIZE:
+                results[i]['messages'].append(f"Error: image must be at most {settings.UPLOAD_MAX_SIZE} bytes")
+                continue
+            uploads.append((i, image))
+
+        with track_stage('storage_put'):
+            paths = object_storage.put_many(files=[(image.name, image) for _, image in uploads], hash_path=True)
+
+        new_ads = []
+        for (i, _), path in zip(uploads, paths):
+            if isinstance(path, Exception):
+                results[i]['messages'].append(f"Error: {path}")
+                continue
+            new_ads.append((i, VehicleAD(
+                image=path,
+                email=request.POST['email'],
+                description=descriptions[i],
+            )))
+
+        if new_ads:
+            with track_stage('db_insert'), transaction.atomic():
+                last_pk = VehicleAD.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+                VehicleAD.objects.bulk_create([ad for _, ad in new_ads])
+                if any(ad.pk is None for _, ad in new_ads):
+                    # MySQL does not return the ids of bulk inserted rows
+                    ids = dict(
+                        VehicleAD.objects.filter(
+                            pk__gt=last_pk,
+                            image__in=[ad.image for _, ad in new_ads]
+                        ).values_list('image', 'pk')
+                    )
+                    for _, ad in new_ads:
+                        ad.pk = ids[ad.image]
+                OutboxMessage.for_submission(ad for _, ad in new_ads)
+                record_moderation(VehicleAD.StateAD.REVIEW, count=len(new_ads))
+            ADS_SUBMITTED.inc(len(new_ads))
+
+            for i, ad in new_ads:
+                results[i].update(success=True, id=ad.pk, messages=['your ad has been received.'])
+
+        if len(new_ads) == len(images):
+            status_code = HttpStatusCodes.CREATED
+        elif new_ads:
+            status_code = HttpStatusCodes.MULTI_STATUS
+        else:
+            status_code = HttpStatusCodes.BAD_REQUEST
+
+        return ApiResponse(
+            success=bool(new_ads),
+            status_code=status_code,
+            messages=[f"{len(new_ads)} of {len(images)} ads have been received. we will notify you by email."],
+            data={'ads': results}
+        ).response()
+
+    except ConnectionError as e:
+        response = ApiResponse(
+            success=False,
+            status_code=HttpStatusCodes.SERVICE_UNAVAILABLE,
+            messages=[f"Error: {e}",]
+        ).response()
+        response['Retry-After'] = __retry_after(e)
+        return response
+
+    except Exception as e:
+        return ApiResponse(
+            success=False,
+            status_code=HttpStatusCodes.BAD_REQUEST,
+            messages=[f"Error: {e}",]
+        ).response()
+
 
-        if ad.state == VehicleAD.StateAD.REJECTED:
+@csrf_exempt
+@require_http_methods(["POST"])
+@admission_control
+def new_vehicle_ad_upload(request):
+    try:
+        __check_keys(request)
+        __check_upload_keys(request)
+
+        upload = object_storage.presign_upload(
+            path=request.POST['filename'],
+            content_type=request.POST['content_type'],
+            size=int(request.POST['size']),
+            max_size=settings.UPLOAD_MAX_SIZE,
+            expires_in=settings.UPLOAD_URL_EXPIRES_IN,
+            hash_path=True
+        )
+
+        with transaction.atomic():
+            new_ad = VehicleAD()
+            new_ad.state = VehicleAD.StateAD.PENDING
+            new_ad.image = upload['url']
+            new_ad.email = request.POST['email']
+            new_ad.description = request.POST['description']
+            new_ad.save()
+            record_moderation(new_ad.state)
+
+        return ApiResponse(
+            status_code=HttpStatusCodes.CREATED,
+            messages=[
+                'upload your image with one of the given urls, then finalize your ad.'
+            ],
+            data={
+                'ad_id': new_ad.pk,
+                'expires_in': settings.UPLOAD_URL_EXPIRES_IN,
+                'post': upload['post'],
+                'put': upload['put'],
+            }
+        ).response()
+
+    except Exception as e:
+        return ApiResponse(
+            success=False,
+            status_code=HttpStatusCodes.BAD_REQUEST,
+            messages=[f"Error: {e}",]
+        ).response()
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@admission_control
+def finalize_vehicle_ad(request, ad_id):
+    try:
+        ad = VehicleAD.objects.get(pk=ad_id)
+        if ad.state != VehicleAD.StateAD.PENDING:
             return ApiResponse(
                 success=False,
-                status_code=HttpStatusCodes.FORBIDDEN,
-                messages=['unfortunately your ad has been rejected.']
+                status_code=HttpStatusCodes.CONFLICT,
+                messages=[f"ad with id: {ad_id} is already finalized",]
             ).response()
 
-        elif ad.state == VehicleAD.StateAD.REVIEW:
+        with track_stage('storage_head'):
+            metadata = object_storage.head(object_storage.path_from_url(ad.image))
+        if metadata is None:
+            raise Exception("image has not been uploaded yet")
+        if metadata['size'] > settings.UPLOAD_MAX_SIZE:
+            raise Exception("image is too large")
+        if metadata['content_type'] not in settings.UPLOAD_ALLOWED_CONTENT_TYPES:
+            raise Exception(f"Invalid image content type: {metadata['content_type']}")
+
+        with track_stage('db_update'), transaction.atomic():
+            finalized = ad.transition(VehicleAD.StateAD.PENDING, VehicleAD.StateAD.REVIEW)
+            if finalized:
+                OutboxMessage.for_submission([ad])
+        if not finalized:
             return ApiResponse(
                 success=False,
-                status_code=HttpStatusCodes.NOT_FOUND,
-                messages=['your ad is still under review.']
+                status_code=HttpStatusCodes.CONFLICT,
+                messages=[f"ad with id: {ad_id} is already finalized",]
             ).response()
+        ADS_SUBMITTED.inc()
 
-        else:
-            return ApiResponse.response_from_objects(
-                key='ad',
-                objects=ad,
-            )
+        return ApiResponse(
+            status_code=HttpStatusCodes.ACCEPTED,
+            messages=[
+                'your ad has been received.check your email. we will notify you when it is accepted or rejected.'
+            ]
+        ).response()
 
     except VehicleAD.DoesNotExist:
         return ApiResponse(
@@ -86,6 +267,205 @@ def get_vehicle_ad(request, ad_id):
             messages=[f"ad with id: {ad_id} does not exist",]
         ).response()
 
+    except ConnectionError as e:
+        response = ApiResponse(
+            success=False,
+            status_code=HttpStatusCodes.SERVICE_UNAVAILABLE,
+            messages=[f"Error: {e}",]
+        ).response()
+        response['Retry-After'] = __retry_after(e)
+        return response
+
+    except Exception as e:
+        return ApiResponse(
+            success=False,
+            status_code=HttpStatusCodes.BAD_REQUEST,
+            messages=[f"Error: {e}",]
+        ).response()
+
+
+@require_http_methods(["GET"])
+@read_from_replica
+def get_vehicle_ad(request, ad_id):
+    ad = VehicleAD.objects.filter(pk=ad_id).first()
+    status_code, messages = __ad_visibility(ad_id, ad)
+    if status_code != HttpStatusCodes.OK:
+        return ApiResponse(
+            success=False,
+            status_code=status_code,
+            messages=messages
+        ).response()
+
+    return ApiResponse.response_from_objects(
+        key='ad',
+        objects=ad,
+    )
+
+
+async def wait_for_vehicle_ad(request, ad_id):
+    # async, so an ASGI worker holds thousands of these on one event loop.
+    # under WSGI every call would get a loop, a subscription and a blocked
+    # thread of its own, so send those callers to the ASGI server
+    if not isinstance(request, ASGIRequest):
+        if not settings.LONG_POLL_URL:
+            return ApiResponse(
+                success=False,
+                status_code=HttpStatusCodes.MISDIRECTED_REQUEST,
+                messages=["Error: waiting for an ad is not served here",]
+            ).response()
+        response = ApiResponse(
+            success=False,
+            status_code=HttpStatusCodes.TEMPORARY_REDIRECT,
+            messages=["Error: waiting for an ad is served by the long-poll server",]
+        ).response()
+        response['Location'] = settings.LONG_POLL_URL.rstrip('/') + request.get_full_path()
+        return response
+    # require_http_methods is not async-aware before Django 5.0
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    try:
+        timeout = float(request.GET.get('timeout', settings.LONG_POLL_TIMEOUT))
+        if not 0 <= timeout <= settings.LONG_POLL_MAX_TIMEOUT:
+            raise Exception(f"timeout must be between 0 and {settings.LONG_POLL_MAX_TIMEOUT} seconds")
+    except Exception as e:
+        return ApiResponse(
+            success=False,
+            status_code=HttpStatusCodes.BAD_REQUEST,
+            messages=[f"Error: {e}",]
+        ).response()
+
+    waiting_states = (VehicleAD.StateAD.REVIEW, VehicleAD.StateAD.PENDING)
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        async with moderation_listener.subscription(ad_id) as decision:
+            ad = await sync_to_async(__find_ad, thread_sensitive=False)(ad_id)
+            remaining = deadline - asyncio.get_running_loop().time()
+            if ad is None or ad.state not in waiting_states or remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(decision, remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    status_code, messages = __ad_visibility(ad_id, ad)
+    if status_code != HttpStatusCodes.OK:
+        return ApiResponse(
+            success=False,
+            status_code=status_code,
+            messages=messages
+        ).response()
+
+    return ApiResponse.response_from_objects(
+        key='ad',
+        objects=ad,
+    )
+
+
+@require_http_methods(["GET"])
+@read_from_replica
+def get_vehicle_ads_batch(request):
+    try:
+        ids = []
+        for value in request.GET.getlist('ids'):
+            for ad_id in value.split(','):
+                if not ad_id.strip().isdigit():
+                    raise Exception(f"Invalid ad id: {ad_id}")
+                if int(ad_id) not in ids:
+                    ids.append(int(ad_id))
+        if not ids:
+            raise Exception("Missing key: ids")
+        if len(ids) > settings.BATCH_MAX_IDS:
+            raise Exception(f"at most {settings.BATCH_MAX_IDS} ads can be fetched at once")
+
+        ads = VehicleAD.objects.in_bulk(ids)
+        results = []
+        for ad_id in ids:
+            status_code, messages = __ad_visibility(ad_id, ads.get(ad_id))
+            visible = status_code == HttpStatusCodes.OK
+            results.append({
+                'id': ad_id,
+                'success': visible,
+                'status_code': status_code,
+                'messages': messages,
+                'ad': ApiResponse.serialize(ads[ad_id]) if visible else None,
+            })
+
+        return ApiResponse(
+            status_code=HttpStatusCodes.OK,
+            data={'ads': results}
+        ).response()
+
+    except Exception as e:
+        return ApiResponse(
+            success=False,
+            status_code=HttpStatusCodes.BAD_REQUEST,
+            messages=[f"Error: {e}",]
+        ).response()
+
+
+@require_http_methods(["GET"])
+@read_from_replica
+def get_moderation_stats(request):
+    try:
+        days = int(request.GET.get('days', settings.STATS_DEFAULT_DAYS))
+        if not 0 < days <= settings.STATS_MAX_DAYS:
+            raise Exception(f"days must be between 1 and {settings.STATS_MAX_DAYS}")
+        since = timezone.now().date() - timedelta(days=days - 1)
+
+        totals = {}
+        for row in ModerationTotal.objects.values('state', 'category').annotate(total=Sum('count')).order_by():
+            totals.setdefault(row['state'], {})[row['category']] = row['total']
+
+        daily = list(
+            ModerationStat.objects
+            .filter(day__gte=since)
+            .values('day', 'state', 'category')
+            .annotate(count=Sum('count'))
+            .order_by('-day', 'state', 'category')
+        )
+        for row in daily:
+            row['day'] = row['day'].isoformat()
+
+        return ApiResponse(
+            status_code=HttpStatusCodes.OK,
+            data={'totals': totals, 'daily': daily}
+        ).response()
+
+    except Exception as e:
+        return ApiResponse(
+            success=False,
+            status_code=HttpStatusCodes.BAD_REQUEST,
+            messages=[f"Error: {e}",]
+        ).response()
+
+
+def __find_ad(ad_id):
+    # runs on the loop's shared pool rather than the request's own thread,
+    # and hands the connection back so a sleeping waiter holds none
+    try:
+        return VehicleAD.objects.filter(pk=ad_id).first()
+    finally:
+        connection.close()
+
+
+def __ad_visibility(ad_id, ad):
+    # what GET vehicle/ads/<id> answers for an ad: accepted ads are public,
+    # everything else gets a status and a reason
+    if ad is None:
+        return HttpStatusCodes.NOT_FOUND, [f"ad with id: {ad_id} does not exist",]
+    if ad.state == VehicleAD.StateAD.REJECTED:
+        return HttpStatusCodes.FORBIDDEN, ['unfortunately your ad has been rejected.']
+    if ad.state == VehicleAD.StateAD.PENDING:
+        return HttpStatusCodes.NOT_FOUND, ['the image of your ad has not been uploaded yet.']
+    if ad.state == VehicleAD.StateAD.REVIEW:
+        return HttpStatusCodes.NOT_FOUND, ['your ad is still under review.']
+    return HttpStatusCodes.OK, []
+
+
+def __retry_after(e):
+    # Retry-After takes whole seconds
+    return str(math.ceil(getattr(e, 'retry_after', settings.CIRCUIT_BREAKER_RESET_TIMEOUT)))
+
 
 def __check_keys(request):
     keys = ['description', 'email']
@@ -97,6 +477,21 @@ def __check_keys(request):
         raise Exception("Invalid email") 
     
 
+def __check_upload_keys(request):
+    keys = ['filename', 'content_type', 'size']
+    for key in keys:
+        if key not in request.POST:
+            raise Exception(f"Missing key: {key}")
+
+    if request.POST['content_type'] not in settings.UPLOAD_ALLOWED_CONTENT_TYPES:
+        raise Exception(f"Invalid content type. allowed types: {', '.join(settings.UPLOAD_ALLOWED_CONTENT_TYPES)}")
+
+    if not request.POST['size'].isdigit() or not 0 < int(request.POST['size']) <= settings.UPLOAD_MAX_SIZE:
+        raise Exception(f"Invalid size. images must be at most {settings.UPLOAD_MAX_SIZE} bytes")
+
+
 def __check_image_file(request):
     if 'image' not in request.FILES or request.FILES['image'] is None:
         raise Exception("Missing image file")
+    if request.FILES['image'].size > settings.UPLOAD_MAX_SIZE:
+        raise Exception(f"image must be at most {settings.UPLOAD_MAX_SIZE} bytes")
@@ -0,0 +1,139 @@
+from typing import List
+from functools import wraps
+
+import os
+import time
+import logging
+import threading
+
+import pika
+
+from django.conf import settings
+
+from apis.responses import ApiResponse
+from apis.constants import HttpStatusCodes
+from apis.clients import redis_client, rabbitmq
+
+
+logger = logging.getLogger(__name__)
+
+
+class _AdmissionController:
+    _LAG_KEY = 'admission:validation_lag'
+
+    def __init__(
+            self,
+            amqp_url: str,
+            queue_names: List[str],
+            max_queue_depth: int,
+            max_validation_lag: float,
+            refresh_interval: float,
+            retry_after: int
+        ) -> None:
+        self._amqp_url = amqp_url
+        self._queue_names = queue_names
+        self._max_queue_depth = max_queue_depth
+        self._max_validation_lag = max_validation_lag
+        self._refresh_interval = refresh_interval
+        self._retry_after = retry_after
+
+        self._queue_depth = 0
+        self._validation_lag = 0.0
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()
+        self._pid = None
+
+    @property
+    def queue_depth(self) -> int:
+        self.__ensure_monitor()
+        return self._queue_depth
+
+    @property
+    def validation_lag(self) -> float:
+        self.__ensure_monitor()
+        return self._validation_lag
+
+    @property
+    def retry_after(self) -> int:
+        return self._retry_after
+
+    def is_overloaded(self) -> bool:
+        self.__ensure_monitor()
+        if time.monotonic() - self._refreshed_at > 3 * self._refresh_interval:
+            # stale numbers (e.g. broker unreachable): fail open
+            return False
+
+        cond1 = self._max_queue_depth > 0 and self._queue_depth >= self._max_queue_depth
+        cond2 = self._max_validation_lag > 0 and self._validation_lag >= self._max_validation_lag
+        return cond1 or cond2
+
+    def record_validation_lag(self, enqueued_at: float) -> None:
+        # from the x-enqueued-at header: how long the ad waited in the
+        # queue, not counting its time in the retry queues
+        lag = max(0.0, time.time() - enqueued_at)
+        try:
+            redis_client.set(self._LAG_KEY, lag, ex=max(60, int(10 * self._refresh_interval)))
+        except Exception as e:
+            logger.warning(e)
+
+    def __ensure_monitor(self) -> None:
+        # started lazily so every forked web/worker process gets its own thread
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(
+                target=self.__refresh_loop,
+                name='admission-monitor',
+                daemon=True
+            ).start()
+
+    def __refresh_loop(self) -> None:
+        connection = None
+        while True:
+            try:
+                if connection is None or connection.is_closed:
+                    connection = pika.BlockingConnection(pika.URLParameters(self._amqp_url))
+                    channel = connection.channel()
+
+                depth = sum(
+                    channel.queue_declare(queue=queue, passive=True).method.message_count
+                    for queue in self._queue_names
+                )
+                lag = redis_client.get(self._LAG_KEY)
+
+                self._queue_depth = depth
+                self._validation_lag = float(lag) if lag is not None else 0.0
+                self._refreshed_at = time.monotonic()
+            except Exception as e:
+                logger.warning(f"admission monitor refresh failed: {e}")
+                connection = None
+
+            time.sleep(self._refresh_interval)
+
+
+def admission_control(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if admission_controller.is_overloaded():
+            response = ApiResponse(
+                success=False,
+                status_code=HttpStatusCodes.SERVICE_UNAVAILABLE,
+                messages=['we are receiving too many ads right now. please try again later.']
+            ).response()
+            response['Retry-After'] = str(admission_controller.retry_after)
+            return response
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+admission_controller = _AdmissionController(
+    amqp_url=settings.RABBITMQ_AMQP_URL,
+    queue_names=rabbitmq.queue_names,
+    max_queue_depth=settings.ADMISSION_MAX_QUEUE_DEPTH,
+    max_validation_lag=settings.ADMISSION_MAX_VALIDATION_LAG,
+    refresh_interval=settings.ADMISSION_REFRESH_INTERVAL,
+    retry_after=settings.ADMISSION_RETRY_AFTER
+)
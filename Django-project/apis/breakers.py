@@ -0,0 +1,116 @@
+from typing import Dict, Tuple, Type
+
+import time
+import logging
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(ConnectionError):
+    def __init__(self, name: str, retry_after: float) -> None:
+        super().__init__(f"{name} is unavailable. circuit is open")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class _CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(
+            self,
+            name: str,
+            failure_threshold: int,
+            reset_timeout: float,
+            failure_exceptions: Tuple[Type[BaseException], ...] = (ConnectionError,)
+        ) -> None:
+
+        if failure_threshold < 1:
+            raise ValueError("failure_threshold must be at least 1")
+
+        self._name = name
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._failure_exceptions = failure_exceptions
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._opened_total = 0
+        self._rejected_total = 0
+
+        breakers[name] = self
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and self.__retry_after() <= 0:
+                return self.HALF_OPEN
+            return self._state
+
+    def status(self) -> Dict[str, int | float | str]:
+        state = self.state
+        with self._lock:
+            return {
+                'state': state,
+                'consecutive_failures': self._failures,
+                'retry_after': self.__retry_after() if state == self.OPEN else 0,
+                'opened_total': self._opened_total,
+                'rejected_total': self._rejected_total,
+            }
+
+    def __enter__(self) -> '_CircuitBreaker':
+        with self._lock:
+            if self._state == self.CLOSED:
+                return self
+
+            if self._state == self.OPEN and self.__retry_after() <= 0:
+                self._state = self.HALF_OPEN
+                self._probing = False
+
+            if self._state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return self
+
+            self._rejected_total += 1
+            raise CircuitOpenError(self._name, retry_after=max(self.__retry_after(), 1.0))
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        with self._lock:
+            if exc_type is not None and issubclass(exc_type, self._failure_exceptions):
+                self.__record_failure()
+            else:
+                self.__record_success()
+        return False
+
+    def __record_success(self) -> None:
+        if self._state != self.CLOSED:
+            logger.warning(f"circuit {self._name} closed")
+        self._state = self.CLOSED
+        self._failures = 0
+        self._probing = False
+
+    def __record_failure(self) -> None:
+        self._failures += 1
+        if self._state == self.HALF_OPEN or self._failures >= self._failure_threshold:
+            if self._state != self.OPEN:
+                self._opened_total += 1
+                logger.critical(f"circuit {self._name} opened after {self._failures} failures")
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._probing = False
+
+    def __retry_after(self) -> float:
+        return self._opened_at + self._reset_timeout - time.monotonic()
+
+
+breakers: Dict[str, _CircuitBreaker] = {}
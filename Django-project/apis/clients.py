@@ -1,29 +1,61 @@
-from typing import Type
+from typing import IO, Any, Dict, Iterator, List, Tuple, Type
 from hashlib import sha256
+from contextlib import contextmanager, nullcontext, suppress
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+from email.utils import parsedate_to_datetime
 from requests import request
 
 import boto3
 import botocore
+import botocore.config
+import math
+import time
 import logging
+import secrets
 import pika
+import redis
+import requests
 
 from django.conf import settings
 from django.utils import timezone
 
+from apis.constants import HttpStatusCodes
+from apis.limiters import RateLimitExceeded, _TokenBucketLimiter
+from apis.breakers import _CircuitBreaker
+from apis.scheduling import _FairScheduler
+from apis.sharding import _ShardCoordinator
+
 
 logger = logging.getLogger(__name__)
 
 
 class _ObjectStorageClient:
-    def __init__(self, key: str, secret: str, bucket: str, url: str) -> None:
+    def __init__(
+            self,
+            key: str,
+            secret: str,
+            bucket: str,
+            url: str,
+            timeout: float = 10,
+            max_concurrency: int = 8,
+            breaker: _CircuitBreaker | None = None
+        ) -> None:
         self._url = url
         self._bucket = bucket
+        self._max_concurrency = max_concurrency
+        self._breaker = breaker or nullcontext()
         try:
             self._resource = boto3.resource(
                 's3',
                 endpoint_url=url,
                 aws_access_key_id=key,
                 aws_secret_access_key=secret,
+                config=botocore.config.Config(
+                    connect_timeout=timeout,
+                    read_timeout=timeout,
+                    retries={'max_attempts': 2},
+                ),
             )
         except ValueError as e:
             logger.warning(e)
@@ -32,7 +64,7 @@ class _ObjectStorageClient:
     def put(
             self, 
             path: str, 
-            file: bytes, 
+            file: bytes | IO[bytes], 
             acl: str = settings.AWS_DEFAULT_ACL, 
             hash_path: bool=False
         ) -> str:
@@ -44,82 +76,517 @@ class _ObjectStorageClient:
             if hash_path:
                 path = self.__hash_path(path)
 
-            self._resource.Bucket(self._bucket).put_object(
-                ACL=acl,
-                Body=file,
-                Key=path,
-            )
+            with self.__storage_call():
+                # the low-level client is thread-safe, the resource is not (see put_many)
+                self._resource.meta.client.put_object(
+                    Bucket=self._bucket,
+                    ACL=acl,
+                    Body=file,
+                    Key=path,
+                )
             return settings.AWS_S3_GET_URL + path
-        except botocore.exceptions.EndpointConnectionError as e:
-            logger.critical(e)
-            raise ConnectionError("Connection to storage failed")
         except botocore.exceptions.ParamValidationError as e:
             logger.critical(e)
             raise ValueError("Invalid parameters. file must be <class \'bytes\'>. others must be <class \'str\'>")
 
+    def put_many(
+            self,
+            files: List[Tuple[str, bytes | IO[bytes]]],
+            acl: str = settings.AWS_DEFAULT_ACL,
+            hash_path: bool = False
+        ) -> List[str | Exception]:
+        # file objects are streamed to the bucket, so pass uploads as they
+        # are instead of reading them into memory first
+
+        def put_one(item: Tuple[str, bytes | IO[bytes]]) -> str | Exception:
+            try:
+                return self.put(path=item[0], file=item[1], acl=acl, hash_path=hash_path)
+            except Exception as e:
+                return e
+
+        if not files:
+            return []
+        with ThreadPoolExecutor(max_workers=min(len(files), self._max_concurrency)) as executor:
+            return list(executor.map(put_one, files))
+
     def delete(self, path: str) -> None:
         try:
-            bucket = self._resource.Bucket(self._bucket)
-            obj = bucket.Object(path)
-            obj.delete()
+            with self.__storage_call():
+                bucket = self._resource.Bucket(self._bucket)
+                obj = bucket.Object(path)
+                obj.delete()
         except botocore.exceptions.ClientError as e:
             logger.warning(e)
             raise e
 
+    def delete_many(self, paths: List[str]) -> List[str]:
+        # DeleteObjects takes at most 1000 keys per request. returns the
+        # paths that could not be deleted
+        failed = []
+        client = self._resource.meta.client
+        for start in range(0, len(paths), 1000):
+            chunk = paths[start:start + 1000]
+            with self.__storage_call():
+                response = client.delete_objects(
+                    Bucket=self._bucket,
+                    Delete={'Objects': [{'Key': path} for path in chunk], 'Quiet': True}
+                )
+            for error in response.get('Errors', []):
+                logger.warning(f"deleting {error['Key']} failed: {error.get('Message')}")
+                failed.append(error['Key'])
+        return failed
+
+    def list_objects(self, prefix: str = '', page_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+        # one page at a time, so callers never hold more than page_size keys
+        client = self._resource.meta.client
+        params = {'Bucket': self._bucket, 'Prefix': prefix, 'MaxKeys': page_size}
+        while True:
+            with self.__storage_call():
+                response = client.list_objects_v2(**params)
+
+            yield [
+                {'path': item['Key'], 'size': item['Size'], 'last_modified': item['LastModified']}
+                for item in response.get('Contents', [])
+            ]
+            if not response.get('IsTruncated'):
+                return
+            params['ContinuationToken'] = response['NextContinuationToken']
+
+    def presign_upload(
+            self,
+            path: str,
+            content_type: str,
+            size: int,
+            max_size: int,
+            expires_in: int,
+            acl: str = settings.AWS_DEFAULT_ACL,
+            hash_path: bool = False
+        ) -> Dict[str, Any]:
+
+        if hash_path:
+            path = self.__hash_path(path)
+
+        client = self._resource.meta.client
+        post = client.generate_presigned_post(
+            Bucket=self._bucket,
+            Key=path,
+            Fields={'acl': acl, 'Content-Type': content_type},
+            Conditions=[
+                {'acl': acl},
+                {'Content-Type': content_type},
+                ['content-length-range', 1, max_size],
+            ],
+            ExpiresIn=expires_in
+        )
+        put_url = client.generate_presigned_url(
+            'put_object',
+            Params={
+                'Bucket': self._bucket,
+                'Key': path,
+                'ACL': acl,
+                'ContentType': content_type,
+                'ContentLength': size,
+            },
+            ExpiresIn=expires_in
+        )
+        return {
+            'path': path,
+            'url': settings.AWS_S3_GET_URL + path,
+            'post': post,
+            'put': {
+                'url': put_url,
+                'headers': {'Content-Type': content_type, 'x-amz-acl': acl},
+            },
+        }
+
+    def head(self, path: str) -> Dict[str, Any] | None:
+        try:
+            with self.__storage_call():
+                obj = self._resource.Object(self._bucket, path)
+                obj.load()
+            return {'size': obj.content_length, 'content_type': obj.content_type}
+        except botocore.exceptions.ClientError as e:
+            logger.warning(e)
+            return None
+
+    def path_from_url(self, url: str) -> str:
+        if not url.startswith(settings.AWS_S3_GET_URL):
+            raise ValueError(f"{url} is not stored in this bucket")
+        return url[len(settings.AWS_S3_GET_URL):]
+
     def is_object_available(self, path: str) -> bool:
         try:
-            self._resource.Object(self._bucket, path).load()
+            with self.__storage_call():
+                self._resource.Object(self._bucket, path).load()
             return True
         except botocore.exceptions.ClientError as e:
             logger.critical(e)
             return False
     
+    @contextmanager
+    def __storage_call(self):
+        # 5xx responses (SlowDown, InternalError, ...) mean the storage is
+        # unavailable just like a dropped connection, so the breaker counts both
+        with self._breaker:
+            try:
+                yield
+            except (botocore.exceptions.ConnectionError, botocore.exceptions.HTTPClientError) as e:
+                logger.critical(e)
+                raise ConnectionError("Connection to storage failed")
+            except botocore.exceptions.ClientError as e:
+                status_code = e.response.get('ResponseMetadata', {}).get('HTTPStatusCode', 0)
+                if status_code < HttpStatusCodes.INTERNAL_SERVER_ERROR:
+                    raise
+                logger.critical(e)
+                raise ConnectionError("storage is unavailable")
+
     def __hash_path(self, path: str) -> str:
-        fname, ftype = path.rsplit('.')
-        fname_hash = sha256(f'{timezone.now()}_{fname}'.encode('utf-8')).hexdigest()
+        parts = path.rsplit('.', 1)
+        if len(parts) != 2 or not parts[1]:
+            raise ValueError(f"file name must have an extension: {path}")
+        fname, ftype = parts
+        fname_hash = sha256(f'{timezone.now()}_{secrets.token_hex(8)}_{fname}'.encode('utf-8')).hexdigest()
         return fname_hash + f'.{ftype}'
 
 
 class _RabbitMQClient:
-    def __init__(self, amqp_url: str, queue_name: str) -> None:
+    def __init__(
+            self,
+            amqp_url: str,
+            queue_name: str,
+            timeout: float = 10,
+            retry_delays: List[int] | None = None,
+            max_priority: int = 0,
+            shards: int = 1,
+            shard_coordinator: _ShardCoordinator | None = None,
+            breaker: _CircuitBreaker | None = None
+        ) -> None:
         self._amqp_url = amqp_url
-        self._connection = pika.BlockingConnection(pika.URLParameters(amqp_url))
-        
-        self._channel = self._connection.channel()
+        self._parameters = pika.URLParameters(amqp_url)
+        self._parameters.socket_timeout = timeout
+        self._parameters.blocked_connection_timeout = timeout
+        self._breaker = breaker or nullcontext()
+
+        self._connection = None
+        self._channel = None
+        self._tx_channel = None
+        self._delivery_channel = None
         self._queue_name = queue_name
-        self._channel.queue_declare(queue=self._queue_name)
+        self._retry_delays = sorted(retry_delays or [10, 60, 300, 1800])
+        self._max_priority = max_priority
+        self._shards = shards
+        self._shard_coordinator = shard_coordinator
+        self._shard_exchange = f'{queue_name}.shards'
+        self._dead_letter_exchange = f'{queue_name}.dlx'
+        self._dead_letter_queue = f'{queue_name}.dead'
+
+    @property
+    def queue_names(self) -> List[str]:
+        if self._shards <= 1:
+            return [self._queue_name]
+        return [self._queue_name] + [self.__shard_queue(shard) for shard in range(self._shards)]
         
-    def put(self, data: str) -> None:
-        self._channel.basic_publish(
-            exchange='',
-            routing_key=self._queue_name,
-            body=data
-        )
+    def put(
+            self,
+            data: str,
+            attempt: int = 0,
+            tenant: str | None = None,
+            priority: int | None = None
+        ) -> None:
+        with self._breaker:
+            try:
+                exchange, routing_key = self.__route(data)
+                self.__get_channel().basic_publish(
+                    exchange=exchange,
+                    routing_key=routing_key,
+                    body=data,
+                    properties=self.__properties(data, attempt=attempt, tenant=tenant, priority=priority)
+                )
+            except (pika.exceptions.AMQPError, OSError) as e:
+                self.__reset(e)
+
+    def put_many(
+            self,
+            data: List[str],
+            tenant: str | None = None,
+            priorities: List[int | None] | None = None
+        ) -> None:
+        # one AMQP transaction per batch: a single round trip, and the
+        # broker has accepted every message (or none) once tx_commit returns
+        if not data:
+            return
+        priorities = priorities or [None] * len(data)
+        with self._breaker:
+            try:
+                channel = self.__get_tx_channel()
+                for item, priority in zip(data, priorities):
+                    exchange, routing_key = self.__route(item)
+                    channel.basic_publish(
+                        exchange=exchange,
+                        routing_key=routing_key,
+                        body=item,
+                        properties=self.__properties(item, tenant=tenant, priority=priority)
+                    )
+                channel.tx_commit()
+            except (pika.exceptions.AMQPError, OSError) as e:
+                self.__reset(e)
+    
+    def retry(
+            self,
+            data: str,
+            attempt: int,
+            delay: float | None = None,
+            tenant: str | None = None,
+            priority: int | None = None
+        ) -> int:
+        # parks the message in a TTL queue that dead-letters back into the
+        # main queue, so nothing has to sleep while waiting for it
+        if delay is None:
+            delay = self._retry_delays[min(max(attempt, 1), len(self._retry_delays)) - 1]
+        tier = next((d for d in self._retry_delays if d >= delay), self._retry_delays[-1])
+
+        with self._breaker:
+            try:
+                self.__get_channel().basic_publish(
+                    exchange='',
+                    routing_key=self.__retry_queue(tier),
+                    body=data,
+                    properties=self.__properties(
+                        data,
+                        attempt=attempt,
+                        tenant=tenant,
+                        priority=priority,
+                        enqueued_at=time.time() + tier
+                    )
+                )
+            except (pika.exceptions.AMQPError, OSError) as e:
+                self.__reset(e)
+        return tier
+
+    def park(self, data: str, attempt: int, reason: str, tenant: str | None = None) -> None:
+        with self._breaker:
+            try:
+                self.__get_channel().basic_publish(
+                    exchange=self._dead_letter_exchange,
+                    routing_key=self._queue_name,
+                    body=data,
+                    properties=self.__properties(data, attempt=attempt, tenant=tenant, reason=reason[:1024])
+                )
+            except (pika.exceptions.AMQPError, OSError) as e:
+                self.__reset(e)
     
     def pop(self) -> str:
-        method_frame, header_frame, body = self._channel.basic_get(queue=self._queue_name)
-        if method_frame:
-            self._channel.basic_ack(method_frame.delivery_tag)
-            return body.decode('utf-8')
+        ad_id, _, delivery_tag = self.pop_message()
+        if delivery_tag is not None:
+            self.ack(delivery_tag)
+        return ad_id
+
+    def pop_message(self) -> Tuple[str, Dict[str, Any], int | None]:
+        # the message stays unacked until ack() or reject(); if the worker
+        # dies or loses its connection first, the broker delivers it again
+        with self._breaker:
+            try:
+                channel = self.__get_channel()
+                for queue in self.__consume_order():
+                    method_frame, header_frame, body = channel.basic_get(queue=queue)
+                    if method_frame:
+                        self._delivery_channel = channel
+                        headers = (header_frame.headers if header_frame else None) or {}
+                        return body.decode('utf-8'), headers, method_frame.delivery_tag
+                return '', {}, None
+            except (pika.exceptions.AMQPError, OSError) as e:
+                self.__reset(e)
+
+    def ack(self, delivery_tag: int) -> None:
+        self.__settle(delivery_tag, ack=True)
+
+    def reject(self, delivery_tag: int) -> None:
+        self.__settle(delivery_tag, ack=False)
+
+    def leave_shards(self) -> None:
+        if self._shard_coordinator is not None:
+            self._shard_coordinator.leave()
+
+    def __settle(self, delivery_tag: int, ack: bool) -> None:
+        # not behind the breaker: a message left unacked on an open channel
+        # is never delivered again. tags only mean something on the channel
+        # they came from, and a reset one has already given its messages back
+        channel = self._delivery_channel
+        if channel is None or channel is not self._channel or channel.is_closed:
+            return
+        try:
+            if ack:
+                channel.basic_ack(delivery_tag)
+            else:
+                channel.basic_reject(delivery_tag, requeue=True)
+        except (pika.exceptions.AMQPError, OSError) as e:
+            # dropping the connection gives the message back all the same
+            with suppress(ConnectionError):
+                self.__reset(e)
+
+    def __route(self, data: str) -> Tuple[str, str]:
+        if self._shards > 1:
+            return self._shard_exchange, data
+        return '', self._queue_name
+
+    def __consume_order(self) -> List[str]:
+        # the unsharded queue last, for messages published before
+        # RABBITMQ_SHARDS was raised
+        if self._shards <= 1:
+            return [self._queue_name]
+        if self._shard_coordinator is None:
+            order = list(range(self._shards))
+        else:
+            order = self._shard_coordinator.shard_order()
+        return [self.__shard_queue(shard) for shard in order] + [self._queue_name]
+
+    def __properties(
+            self,
+            data: str,
+            attempt: int = 0,
+            tenant: str | None = None,
+            priority: int | None = None,
+            reason: str | None = None,
+            enqueued_at: float | None = None
+        ) -> pika.BasicProperties:
+        # x-enqueued-at is when the message reaches the main queue; for a
+        # retry that is once its TTL runs out
+        headers = {
+            'x-attempt': attempt,
+            'x-ad-id': data,
+            'x-enqueued-at': enqueued_at if enqueued_at is not None else time.time()
+        }
+        if tenant is not None:
+            headers['x-tenant'] = tenant
+        if reason is not None:
+            headers['x-reason'] = reason
+        if priority is not None and self._max_priority > 0:
+            priority = min(max(priority, 0), self._max_priority)
         else:
-            return ''
+            priority = None
+        return pika.BasicProperties(headers=headers, priority=priority)
+
+    def __get_channel(self):
+        if self._connection is None or self._connection.is_closed:
+            self._connection = pika.BlockingConnection(self._parameters)
+            self._channel = None
+        if self._channel is None or self._channel.is_closed:
+            self._channel = self._connection.channel()
+            self.__declare_topology(self._channel)
+        return self._channel
+
+    def __declare_topology(self, channel) -> None:
+        # x-max-priority can only be set when the queue is created; switching
+        # RABBITMQ_MAX_PRIORITY on means draining and deleting the old queue
+        arguments = {'x-max-priority': self._max_priority} if self._max_priority > 0 else None
+        channel.queue_declare(queue=self._queue_name, arguments=arguments)
+
+        if self._shards > 1:
+            # needs the rabbitmq_consistent_hash_exchange plugin. hashing the
+            # x-ad-id header instead of the routing key keeps an ad on its
+            # shard when it comes back from a retry queue
+            channel.exchange_declare(
+                exchange=self._shard_exchange,
+                exchange_type='x-consistent-hash',
+                arguments={'hash-header': 'x-ad-id'}
+            )
+            for shard in range(self._shards):
+                channel.queue_declare(queue=self.__shard_queue(shard), arguments=arguments)
+                channel.queue_bind(
+                    queue=self.__shard_queue(shard),
+                    exchange=self._shard_exchange,
+                    routing_key='1'
+                )
+
+        for delay in self._retry_delays:
+            channel.queue_declare(
+                queue=self.__retry_queue(delay),
+                arguments={
+                    'x-message-ttl': delay * 1000,
+                    'x-dead-letter-exchange': self._shard_exchange if self._shards > 1 else '',
+                    'x-dead-letter-routing-key': self._queue_name,
+                }
+            )
+
+        channel.exchange_declare(exchange=self._dead_letter_exchange, exchange_type='direct')
+        channel.queue_declare(queue=self._dead_letter_queue)
+        channel.queue_bind(
+            queue=self._dead_letter_queue,
+            exchange=self._dead_letter_exchange,
+            routing_key=self._queue_name
+        )
+
+    def __retry_queue(self, delay: int) -> str:
+        return f'{self._queue_name}.retry.{delay}s'
+
+    def __shard_queue(self, shard: int) -> str:
+        return f'{self._queue_name}.shard.{shard}'
+
+    def __get_tx_channel(self):
+        self.__get_channel()
+        if self._tx_channel is None or self._tx_channel.is_closed:
+            self._tx_channel = self._connection.channel()
+            self._tx_channel.tx_select()
+        return self._tx_channel
+
+    def __reset(self, e: Exception) -> None:
+        logger.critical(e)
+        try:
+            if self._connection is not None and self._connection.is_open:
+                self._connection.close()
+        except (pika.exceptions.AMQPError, OSError):
+            pass
+        self._connection = None
+        self._channel = None
+        self._tx_channel = None
+        raise ConnectionError("Connection to rabbitmq failed")
 
 
 class _ImaggaClient:
-    def __init__(self, api_key: str, api_secret: str) -> None:
+    def __init__(
+            self,
+            api_key: str,
+            api_secret: str,
+            rate_limiter: _TokenBucketLimiter | None = None,
+            max_wait: float = 0,
+            timeout: float = 10,
+            breaker: _CircuitBreaker | None = None
+        ) -> None:
         self._api_key = api_key
         self._api_secret = api_secret
+        self._rate_limiter = rate_limiter
+        self._max_wait = max_wait
+        self._timeout = timeout
+        self._breaker = breaker or nullcontext()
 
     def get_tags(self, image_url: str, threshold: float = 49) -> dict:
-        response = request(
-            method='GET',
-            url='https://api.imagga.com/v2/tags',
-            params={
-                'image_url': image_url,
-                'threshold': threshold,
-            },
-            auth=(self._api_key, self._api_secret)
-        )
+        if self._rate_limiter is not None:
+            self._rate_limiter.acquire(max_wait=self._max_wait)
+
+        with self._breaker:
+            try:
+                response = request(
+                    method='GET',
+                    url='https://api.imagga.com/v2/tags',
+                    params={
+                        'image_url': image_url,
+                        'threshold': threshold,
+                    },
+                    auth=(self._api_key, self._api_secret),
+                    timeout=self._timeout
+                )
+            except requests.exceptions.RequestException as e:
+                logger.critical(e)
+                raise ConnectionError("Connection to imagga failed")
+            if response.status_code >= HttpStatusCodes.INTERNAL_SERVER_ERROR:
+                logger.critical(f"imagga responded with {response.status_code}")
+                raise ConnectionError("imagga is unavailable")
+
+        if response.status_code == HttpStatusCodes.TOO_MANY_REQUESTS:
+            retry_after = _retry_after(response.headers.get('Retry-After'))
+            logger.warning(f"imagga rate limit reached. retry after {retry_after}s")
+            raise RateLimitExceeded("imagga rate limit reached", retry_after=retry_after)
+
         json_result = response.json()
         if json_result['status']['type'] == 'error':
             raise ValueError(json_result['status']['text'])
@@ -128,22 +595,39 @@ class _ImaggaClient:
 
 
 class _MailgunClient:
-    def __init__(self, api_key: str, domain: str) -> None:
+    def __init__(
+            self,
+            api_key: str,
+            domain: str,
+            timeout: float = 10,
+            breaker: _CircuitBreaker | None = None
+        ) -> None:
         self._api_key = api_key
         self._domain = domain
+        self._timeout = timeout
+        self._breaker = breaker or nullcontext()
 
     def send(self, to: str, subject: str, text: str) -> None:
-        request(
-            method='POST',
-            url=f'https://api.mailgun.net/v3/{self._domain}/messages',
-            auth=('api', self._api_key),
-            data={
-                'from': f'no-reply@{self._domain}',
-                'to': to,
-                'subject': subject,
-                'text': text,
-            }
-        )
+        with self._breaker:
+            try:
+                response = request(
+                    method='POST',
+                    url=f'https://api.mailgun.net/v3/{self._domain}/messages',
+                    auth=('api', self._api_key),
+                    data={
+                        'from': f'no-reply@{self._domain}',
+                        'to': to,
+                        'subject': subject,
+                        'text': text,
+                    },
+                    timeout=self._timeout
+                )
+            except requests.exceptions.RequestException as e:
+                logger.critical(e)
+                raise ConnectionError("Connection to mailgun failed")
+            if response.status_code >= HttpStatusCodes.INTERNAL_SERVER_ERROR:
+                logger.critical(f"mailgun responded with {response.status_code}")
+                raise ConnectionError("mailgun is unavailable")
 
     def send_received_ad_message(self, to: str) -> None:
         get_added_mail_text = f"""\
@@ -201,28 +685,99 @@ class _MailgunClient:
 
 
 
+def _retry_after(value: str | None, default: float = 1) -> float:
+    # delta-seconds or an HTTP-date; anything else falls back to the default
+    if value is None:
+        return default
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return default
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=dt_timezone.utc)
+        seconds = (when - datetime.now(dt_timezone.utc)).total_seconds()
+    return max(seconds, 0) if math.isfinite(seconds) else default
+
+
+def _circuit_breaker(name: str) -> _CircuitBreaker:
+    return _CircuitBreaker(
+        name=name,
+        failure_threshold=settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+        reset_timeout=settings.CIRCUIT_BREAKER_RESET_TIMEOUT
+    )
+
+
+def _redis_from_url(url: str) -> redis.Redis:
+    if url.startswith('rediss://'):
+        return redis.Redis.from_url(url, ssl_cert_reqs=None)
+    return redis.Redis.from_url(url)
+
+
+redis_client = _redis_from_url(settings.REDIS_URL)
+
 ObjectStorage = Type[_ObjectStorageClient]
 object_storage = _ObjectStorageClient(
     key=settings.AWS_ACCESS_KEY_ID,
     secret=settings.AWS_SECRET_ACCESS_KEY,
     bucket=settings.AWS_STORAGE_BUCKET_NAME,
-    url=settings.AWS_S3_ENDPOINT_URL
+    url=settings.AWS_S3_ENDPOINT_URL,
+    timeout=settings.AWS_S3_TIMEOUT,
+    max_concurrency=settings.AWS_S3_MAX_CONCURRENCY,
+    breaker=_circuit_breaker('object_storage')
 )
 
 RabbitMQClient = Type[_RabbitMQClient]
 rabbitmq = _RabbitMQClient(
     amqp_url=settings.RABBITMQ_AMQP_URL,
-    queue_name=settings.RABBITMQ_QUEUE_NAME
+    queue_name=settings.RABBITMQ_QUEUE_NAME,
+    timeout=settings.RABBITMQ_TIMEOUT,
+    retry_delays=settings.RABBITMQ_RETRY_DELAYS,
+    max_priority=settings.RABBITMQ_MAX_PRIORITY,
+    shards=settings.RABBITMQ_SHARDS,
+    shard_coordinator=_ShardCoordinator(
+        redis_client=redis_client,
+        name=settings.RABBITMQ_QUEUE_NAME,
+        shards=settings.RABBITMQ_SHARDS,
+        heartbeat_interval=settings.RABBITMQ_SHARD_HEARTBEAT_INTERVAL
+    ),
+    breaker=_circuit_breaker('rabbitmq')
+)
+
+TokenBucketLimiter = Type[_TokenBucketLimiter]
+imagga_rate_limiter = _TokenBucketLimiter(
+    redis_client=redis_client,
+    name='imagga',
+    rate=settings.IMAGGA_RATE_LIMIT_PER_SECOND,
+    capacity=settings.IMAGGA_RATE_LIMIT_BURST,
+    monthly_quota=settings.IMAGGA_MONTHLY_QUOTA
 )
 
 ImaggaClient = Type[_ImaggaClient]
 imagga_client = _ImaggaClient(
     api_key=settings.IMAGGA_API_KEY,
-    api_secret=settings.IMAGGA_API_SECRET
+    api_secret=settings.IMAGGA_API_SECRET,
+    rate_limiter=imagga_rate_limiter,
+    max_wait=settings.IMAGGA_RATE_LIMIT_MAX_WAIT,
+    timeout=settings.IMAGGA_TIMEOUT,
+    breaker=_circuit_breaker('imagga')
 )
 
 MailgunClient = Type[_MailgunClient]
 email_client = _MailgunClient(
     api_key=settings.MAILGUN_API_KEY,
-    domain=settings.MAILGUN_DOMAIN_NAME
+    domain=settings.MAILGUN_DOMAIN_NAME,
+    timeout=settings.MAILGUN_TIMEOUT,
+    breaker=_circuit_breaker('mailgun')
+)
+
+FairScheduler = Type[_FairScheduler]
+fair_scheduler = _FairScheduler(
+    redis_client=redis_client,
+    max_priority=settings.RABBITMQ_MAX_PRIORITY,
+    default_concurrency=settings.FAIR_SCHEDULING_MAX_CONCURRENCY,
+    concurrency=settings.FAIR_SCHEDULING_CONCURRENCY,
+    weights=settings.FAIR_SCHEDULING_WEIGHTS
 )
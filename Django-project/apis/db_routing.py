@@ -0,0 +1,65 @@
+from contextvars import ContextVar
+from functools import wraps
+
+import random
+
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+
+
+_use_replica: ContextVar[bool] = ContextVar('use_replica', default=False)
+
+PIN_COOKIE_NAME = 'db_pin'
+UNSAFE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias != 'default']
+
+
+class ReplicaRouter:
+    # reads go to a replica only inside views marked with read_from_replica;
+    # everything else, Celery tasks included, keeps reading from the primary
+    def db_for_read(self, model, **hints):
+        if not _use_replica.get():
+            return 'default'
+        replicas = replica_aliases()
+        return random.choice(replicas) if replicas else 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+def read_from_replica(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        # clients that wrote recently read their own writes from the primary
+        if PIN_COOKIE_NAME in request.COOKIES:
+            return view(request, *args, **kwargs)
+
+        token = _use_replica.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+    return wrapper
+
+
+class PrimaryPinningMiddleware(MiddlewareMixin):
+    # MiddlewareMixin keeps async views async under ASGI
+    def process_response(self, request, response):
+        if request.method in UNSAFE_METHODS and response.status_code < 400 and replica_aliases():
+            response.set_cookie(
+                PIN_COOKIE_NAME,
+                '1',
+                max_age=settings.DATABASE_REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax'
+            )
+        return response
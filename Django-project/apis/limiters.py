@@ -0,0 +1,155 @@
+from typing import Dict, Optional, Tuple
+
+import time
+import logging
+
+import redis
+
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, message: str, retry_after: float) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# KEYS: bucket hash, monthly counter, stats hash
+# ARGV: rate, capacity, now, monthly quota (0 = unlimited), seconds until the month ends
+_TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local quota = tonumber(ARGV[4])
+local month_ttl = tonumber(ARGV[5])
+
+local used = tonumber(redis.call('GET', KEYS[2]) or '0')
+if quota > 0 and used >= quota then
+    redis.call('HINCRBY', KEYS[3], 'rejected', 1)
+    redis.call('HSET', KEYS[3], 'last_wait', month_ttl)
+    return {0, '0', tostring(month_ttl), tostring(0)}
+end
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+    if quota > 0 then
+        used = redis.call('INCR', KEYS[2])
+        if used == 1 then
+            redis.call('EXPIRE', KEYS[2], month_ttl + 86400)
+        end
+    end
+    redis.call('HINCRBY', KEYS[3], 'allowed', 1)
+else
+    wait = (1 - tokens) / rate
+    redis.call('HINCRBY', KEYS[3], 'rejected', 1)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+redis.call('HSET', KEYS[3], 'last_wait', tostring(wait))
+
+local remaining = -1
+if quota > 0 then
+    remaining = quota - used
+end
+return {allowed, tostring(tokens), tostring(wait), tostring(remaining)}
+"""
+
+
+class _TokenBucketLimiter:
+    def __init__(
+            self,
+            redis_client: redis.Redis,
+            name: str,
+            rate: float,
+            capacity: int,
+            monthly_quota: int = 0
+        ) -> None:
+
+        if rate <= 0 or capacity < 1:
+            raise ValueError("rate must be positive and capacity at least 1")
+
+        self._redis = redis_client
+        self._name = name
+        self._rate = rate
+        self._capacity = capacity
+        self._monthly_quota = monthly_quota
+        self._script = self._redis.register_script(_TOKEN_BUCKET_SCRIPT)
+
+    def try_acquire(self) -> Tuple[bool, float]:
+        now = timezone.now()
+        allowed, _, wait, _ = self._script(
+            keys=[self.__bucket_key(), self.__month_key(now), self.__stats_key()],
+            args=[
+                self._rate,
+                self._capacity,
+                now.timestamp(),
+                self._monthly_quota,
+                self.__seconds_until_next_month(now),
+            ]
+        )
+        return bool(int(allowed)), float(wait)
+
+    def acquire(self, max_wait: float = 0) -> None:
+        deadline = time.monotonic() + max_wait
+        while True:
+            allowed, wait = self.try_acquire()
+            if allowed:
+                return
+            if time.monotonic() + wait > deadline:
+                raise RateLimitExceeded(f"{self._name} rate limit reached", retry_after=wait)
+            time.sleep(wait)
+
+    def status(self) -> Dict[str, Optional[float]]:
+        now = timezone.now()
+        pipe = self._redis.pipeline()
+        pipe.hmget(self.__bucket_key(), 'tokens', 'ts')
+        pipe.get(self.__month_key(now))
+        pipe.hgetall(self.__stats_key())
+        (tokens, ts), used, stats = pipe.execute()
+
+        if tokens is None:
+            available = float(self._capacity)
+        else:
+            elapsed = max(0.0, now.timestamp() - float(ts))
+            available = min(float(self._capacity), float(tokens) + elapsed * self._rate)
+
+        remaining_quota = None
+        if self._monthly_quota > 0:
+            remaining_quota = float(max(0, self._monthly_quota - int(used or 0)))
+
+        return {
+            'available_tokens': available,
+            'remaining_monthly_quota': remaining_quota,
+            'last_wait_seconds': float(stats.get(b'last_wait', 0)),
+            'allowed_total': float(stats.get(b'allowed', 0)),
+            'limited_total': float(stats.get(b'rejected', 0)),
+        }
+
+    def __bucket_key(self) -> str:
+        return f'ratelimit:{self._name}:bucket'
+
+    def __month_key(self, now) -> str:
+        return f'ratelimit:{self._name}:month:{now:%Y-%m}'
+
+    def __stats_key(self) -> str:
+        return f'ratelimit:{self._name}:stats'
+
+    @staticmethod
+    def __seconds_until_next_month(now) -> int:
+        if now.month == 12:
+            next_month = now.replace(year=now.year + 1, month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+        else:
+            next_month = now.replace(month=now.month + 1, day=1, hour=0, minute=0, second=0, microsecond=0)
+        return int((next_month - now).total_seconds()) + 1
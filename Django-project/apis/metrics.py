@@ -0,0 +1,111 @@
+from contextlib import contextmanager
+from time import perf_counter
+
+import os
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+
+STAGE_LATENCY = Histogram(
+    'vehicle_ads_stage_duration_seconds',
+    'Latency of each ingest and validation stage',
+    ['stage'],
+    buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+)
+STAGE_ERRORS = Counter(
+    'vehicle_ads_stage_errors_total',
+    'Stages that ended with an exception',
+    ['stage']
+)
+ADS_SUBMITTED = Counter(
+    'vehicle_ads_submitted_total',
+    'Ads accepted into the validation pipeline'
+)
+ADS_MODERATED = Counter(
+    'vehicle_ads_moderated_total',
+    'Moderation decisions by outcome',
+    ['state']
+)
+
+
+@contextmanager
+def track_stage(stage: str):
+    start = perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.labels(stage).inc()
+        raise
+    finally:
+        STAGE_LATENCY.labels(stage).observe(perf_counter() - start)
+
+
+class _LiveStateCollector:
+    # values that already live in a shared place (broker, redis) or are
+    # per-process by nature, read at scrape time instead of being mirrored
+    def collect(self):
+        from apis.admission import admission_controller
+        from apis.breakers import breakers
+        from apis.clients import imagga_rate_limiter
+
+        depth = GaugeMetricFamily(
+            'vehicle_ads_validation_queue_depth',
+            'Messages waiting in the validation queue'
+        )
+        depth.add_metric([], admission_controller.queue_depth)
+        yield depth
+
+        lag = GaugeMetricFamily(
+            'vehicle_ads_validation_lag_seconds',
+            'Age of the most recently validated ad when it was picked up'
+        )
+        lag.add_metric([], admission_controller.validation_lag)
+        yield lag
+
+        breaker_state = GaugeMetricFamily(
+            'vehicle_ads_circuit_breaker_state',
+            'Circuit breaker state (0 closed, 1 half open, 2 open)',
+            labels=['client']
+        )
+        states = {'closed': 0, 'half_open': 1, 'open': 2}
+        for name, breaker in breakers.items():
+            breaker_state.add_metric([name], states[breaker.state])
+        yield breaker_state
+
+        try:
+            status = imagga_rate_limiter.status()
+        except Exception:
+            return
+        for key, value in status.items():
+            if value is None:
+                continue
+            metric = GaugeMetricFamily(
+                f'vehicle_ads_imagga_ratelimit_{key}',
+                f'Imagga rate limiter {key.replace("_", " ")}'
+            )
+            metric.add_metric([], value)
+            yield metric
+
+
+def render_metrics() -> bytes:
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = CollectorRegistry()
+        registry.register(_RegistryProxy())
+    registry.register(_LiveStateCollector())
+    return generate_latest(registry)
+
+
+class _RegistryProxy:
+    def collect(self):
+        return REGISTRY.collect()
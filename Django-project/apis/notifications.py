@@ -0,0 +1,116 @@
+from typing import Dict, Set
+from contextlib import asynccontextmanager
+
+import json
+import asyncio
+import logging
+import weakref
+
+import redis
+import redis.asyncio
+
+from django.conf import settings
+
+from apis.clients import redis_client
+
+
+logger = logging.getLogger(__name__)
+
+
+def publish_moderation(ad_id: int, state: str) -> None:
+    # waiters re-read the ad after waking up, so a lost message only
+    # delays them until their timeout
+    try:
+        redis_client.publish(settings.MODERATION_CHANNEL, json.dumps({'id': ad_id, 'state': state}))
+    except redis.RedisError as e:
+        logger.warning(e)
+
+
+class _LoopListener:
+    def __init__(self, url: str, channel: str) -> None:
+        self._url = url
+        self._channel = channel
+        self._waiters: Dict[int, Set[asyncio.Future]] = {}
+        self._task = asyncio.get_running_loop().create_task(self.__listen())
+
+    def subscribe(self, ad_id: int) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(ad_id, set()).add(future)
+        return future
+
+    def unsubscribe(self, ad_id: int, future: asyncio.Future) -> None:
+        futures = self._waiters.get(ad_id)
+        if futures is None:
+            return
+        futures.discard(future)
+        if not futures:
+            del self._waiters[ad_id]
+
+    def __wake(self, ad_id: int | None, state: str | None) -> None:
+        ids = list(self._waiters) if ad_id is None else [ad_id]
+        for waiting_id in ids:
+            for future in self._waiters.pop(waiting_id, ()):
+                if not future.done():
+                    future.set_result(state)
+
+    async def __listen(self) -> None:
+        # one subscription per event loop, shared by every waiting request
+        while True:
+            client = None
+            try:
+                if self._url.startswith('rediss://'):
+                    client = redis.asyncio.Redis.from_url(self._url, ssl_cert_reqs=None)
+                else:
+                    client = redis.asyncio.Redis.from_url(self._url)
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(self._channel)
+                # anything published before we subscribed is lost; send
+                # everyone waiting back to the database
+                self.__wake(None, None)
+
+                async for message in pubsub.listen():
+                    try:
+                        payload = json.loads(message['data'])
+                        self.__wake(int(payload['id']), payload['state'])
+                    except (ValueError, KeyError, TypeError) as e:
+                        logger.warning(f"invalid moderation message: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"moderation listener failed: {e}")
+                self.__wake(None, None)
+                await asyncio.sleep(1)
+            finally:
+                if client is not None:
+                    await client.close()
+
+
+class _ModerationListener:
+    def __init__(self, url: str, channel: str) -> None:
+        self._url = url
+        self._channel = channel
+        self._listeners = weakref.WeakKeyDictionary()
+
+    def __current(self) -> _LoopListener:
+        loop = asyncio.get_running_loop()
+        listener = self._listeners.get(loop)
+        if listener is None:
+            listener = self._listeners[loop] = _LoopListener(self._url, self._channel)
+        return listener
+
+    @asynccontextmanager
+    async def subscription(self, ad_id: int):
+        # subscribe before reading the ad, so a decision that commits in
+        # between still wakes the waiter
+        listener = self.__current()
+        future = listener.subscribe(ad_id)
+        try:
+            yield future
+        finally:
+            listener.unsubscribe(ad_id, future)
+
+
+moderation_listener = _ModerationListener(
+    url=settings.REDIS_URL,
+    channel=settings.MODERATION_CHANNEL
+)
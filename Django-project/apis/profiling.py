@@ -0,0 +1,158 @@
+from contextlib import ExitStack
+from pathlib import Path
+from time import perf_counter
+from typing import Dict
+
+import os
+import json
+import random
+import cProfile
+import logging
+import threading
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+from django.utils.deprecation import MiddlewareMixin
+
+
+logger = logging.getLogger(__name__)
+
+_SIGNING_SALT = 'apis.profiling'
+_local = threading.local()
+
+
+def make_profiling_token() -> str:
+    return signing.TimestampSigner(salt=_SIGNING_SALT).sign('profile')
+
+
+def is_valid_profiling_token(token: str) -> bool:
+    try:
+        signing.TimestampSigner(salt=_SIGNING_SALT).unsign(
+            token,
+            max_age=settings.PROFILING_TOKEN_MAX_AGE
+        )
+        return True
+    except signing.BadSignature:
+        return False
+
+
+class _QueryRecorder:
+    def __init__(self) -> None:
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += perf_counter() - start
+
+
+class _ProfileSession:
+    def __init__(self, kind: str, name: str) -> None:
+        self._kind = kind
+        self._name = name
+        self._profiler = cProfile.Profile()
+        self._queries = _QueryRecorder()
+        self._stack = ExitStack()
+        self._start = 0.0
+        self.profile_id = None
+
+    def __enter__(self) -> '_ProfileSession':
+        _local.active = True
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self._queries))
+        self._start = perf_counter()
+        self._profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self._profiler.disable()
+        duration = perf_counter() - self._start
+        self._stack.close()
+        _local.active = False
+        try:
+            self.__dump(duration)
+        except OSError as e:
+            logger.warning(f"could not write profile: {e}")
+        return False
+
+    def __dump(self, duration: float) -> None:
+        directory = Path(settings.PROFILING_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        name = ''.join(c if c.isalnum() else '_' for c in self._name).strip('_')
+        self.profile_id = f'{timezone.now():%Y%m%dT%H%M%S%f}_{self._kind}_{name}_{os.getpid()}'
+
+        self._profiler.dump_stats(directory / f'{self.profile_id}.prof')
+        summary: Dict[str, str | int | float] = {
+            'kind': self._kind,
+            'name': self._name,
+            'duration': duration,
+            'sql_queries': self._queries.count,
+            'sql_duration': self._queries.duration,
+        }
+        with open(directory / f'{self.profile_id}.json', 'w') as f:
+            json.dump(summary, f)
+
+
+def _should_sample() -> bool:
+    if getattr(_local, 'active', False):
+        return False
+    return settings.PROFILING_SAMPLE_RATE > 0 and random.random() < settings.PROFILING_SAMPLE_RATE
+
+
+class ProfilingMiddleware(MiddlewareMixin):
+    def __init__(self, get_response) -> None:
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed()
+        super().__init__(get_response)
+
+    def __call__(self, request):
+        # cProfile follows a single thread, so requests served on the
+        # event loop are never sampled
+        if self._is_coroutine:
+            return self.get_response(request)
+
+        token = request.headers.get(settings.PROFILING_HEADER)
+        requested = token is not None and is_valid_profiling_token(token)
+        if not (requested or _should_sample()):
+            return self.get_response(request)
+
+        session = _ProfileSession('web', f'{request.method} {request.path}')
+        with session:
+            response = self.get_response(request)
+        if session.profile_id is not None:
+            response['X-Profile-Id'] = session.profile_id
+        return response
+
+
+_task_sessions: Dict[str, _ProfileSession] = {}
+
+
+def _on_task_prerun(task_id=None, task=None, **kwargs) -> None:
+    if not _should_sample():
+        return
+    session = _ProfileSession('task', task.name)
+    _task_sessions[task_id] = session
+    session.__enter__()
+
+
+def _on_task_postrun(task_id=None, **kwargs) -> None:
+    session = _task_sessions.pop(task_id, None)
+    if session is not None:
+        session.__exit__(None, None, None)
+
+
+def install_celery_hooks() -> None:
+    if not settings.PROFILING_ENABLED:
+        return
+
+    from celery.signals import task_prerun, task_postrun
+    task_prerun.connect(_on_task_prerun, weak=False)
+    task_postrun.connect(_on_task_postrun, weak=False)
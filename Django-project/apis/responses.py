@@ -178,6 +178,15 @@ class ApiResponse(object):
             return r.response()
 
 
+    @staticmethod
+    def serialize(
+        obj: models.Model,
+        include: Optional[List[str] | None] = None,
+        exclude: Optional[List[str] | None] = None,
+    ) -> Dict[str, Any]:
+        return ApiResponse.__object_serializer(obj, include, exclude)
+
+
     @staticmethod
     def __object_serializer(
         objects: models.base.Model,
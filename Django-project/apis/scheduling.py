@@ -0,0 +1,105 @@
+from typing import Dict, List
+
+import math
+import time
+import uuid
+import logging
+
+import redis
+
+
+logger = logging.getLogger(__name__)
+
+
+class _FairScheduler:
+    _PENDING_KEY = 'fair:pending'
+
+    def __init__(
+            self,
+            redis_client: redis.Redis,
+            max_priority: int,
+            default_concurrency: int,
+            concurrency: Dict[str, int] | None = None,
+            weights: Dict[str, float] | None = None,
+            inflight_ttl: int = 600
+        ) -> None:
+        self._redis = redis_client
+        self._max_priority = max_priority
+        self._default_concurrency = default_concurrency
+        self._concurrency = {self.tenant(k): int(v) for k, v in (concurrency or {}).items()}
+        self._weights = {self.tenant(k): float(v) for k, v in (weights or {}).items()}
+        self._inflight_ttl = inflight_ttl
+
+    @staticmethod
+    def tenant(email: str) -> str:
+        return email.strip().lower()
+
+    def admit(self, tenant: str, count: int = 1) -> List[int | None]:
+        if self._max_priority <= 0:
+            return [None] * count
+        try:
+            pending = int(self._redis.hincrby(self._PENDING_KEY, tenant, count)) - count
+        except redis.RedisError as e:
+            logger.warning(e)
+            return [self._max_priority] * count
+        return [self.__priority(tenant, pending + i) for i in range(count)]
+
+    def priority(self, tenant: str) -> int | None:
+        if self._max_priority <= 0:
+            return None
+        try:
+            pending = int(self._redis.hget(self._PENDING_KEY, tenant) or 1) - 1
+        except redis.RedisError as e:
+            logger.warning(e)
+            return self._max_priority
+        return self.__priority(tenant, pending)
+
+    def done(self, tenant: str, count: int = 1) -> None:
+        if self._max_priority <= 0:
+            return
+        try:
+            if int(self._redis.hincrby(self._PENDING_KEY, tenant, -count)) < 0:
+                self._redis.hset(self._PENDING_KEY, tenant, 0)
+        except redis.RedisError as e:
+            logger.warning(e)
+
+    def acquire(self, tenant: str) -> str | None:
+        # every validation in flight is a lease that runs out on its own, so
+        # a worker that dies before release() does not keep the slot forever
+        lease = uuid.uuid4().hex
+        limit = self._concurrency.get(tenant, self._default_concurrency)
+        if limit <= 0:
+            return lease
+        key = self.__inflight_key(tenant)
+        now = time.time()
+        try:
+            pipe = self._redis.pipeline()
+            pipe.zremrangebyscore(key, '-inf', now)
+            pipe.zadd(key, {lease: now + self._inflight_ttl})
+            pipe.zcard(key)
+            pipe.expire(key, self._inflight_ttl)
+            _, _, inflight, _ = pipe.execute()
+            if int(inflight) > limit:
+                self._redis.zrem(key, lease)
+                return None
+        except redis.RedisError as e:
+            logger.warning(e)
+        return lease
+
+    def release(self, tenant: str, lease: str) -> None:
+        limit = self._concurrency.get(tenant, self._default_concurrency)
+        if limit <= 0:
+            return
+        try:
+            self._redis.zrem(self.__inflight_key(tenant), lease)
+        except redis.RedisError as e:
+            logger.warning(e)
+
+    def __priority(self, tenant: str, pending: int) -> int:
+        # one level lower every time a submitter's backlog doubles, so a
+        # single ad always overtakes a dealer's thousandth one
+        weight = self._weights.get(tenant, 1.0)
+        return max(0, self._max_priority - int(math.log2(1 + max(pending, 0) / weight)))
+
+    def __inflight_key(self, tenant: str) -> str:
+        return f'fair:inflight:{tenant}'
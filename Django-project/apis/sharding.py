@@ -0,0 +1,74 @@
+from typing import List
+
+import os
+import time
+import socket
+import logging
+
+import redis
+
+
+logger = logging.getLogger(__name__)
+
+
+class _ShardCoordinator:
+    def __init__(
+            self,
+            redis_client: redis.Redis,
+            name: str,
+            shards: int,
+            heartbeat_interval: float = 10
+        ) -> None:
+        self._redis = redis_client
+        self._key = f'shards:{name}:consumers'
+        self._shards = shards
+        self._heartbeat_interval = heartbeat_interval
+
+        self._pid = None
+        self._assigned: List[int] = list(range(shards))
+        self._heartbeat_at = 0.0
+
+    @property
+    def consumer_id(self) -> str:
+        return f'{socket.gethostname()}:{os.getpid()}'
+
+    def assigned(self) -> List[int]:
+        # consumers heartbeat into a sorted set; whoever misses three
+        # heartbeats drops out and its shards move to the others
+        now = time.time()
+        if self._pid == os.getpid() and now - self._heartbeat_at < self._heartbeat_interval:
+            return self._assigned
+        self._pid = os.getpid()
+        self._heartbeat_at = now
+
+        try:
+            pipe = self._redis.pipeline()
+            pipe.zadd(self._key, {self.consumer_id: now})
+            pipe.zremrangebyscore(self._key, '-inf', now - 3 * self._heartbeat_interval)
+            pipe.zrange(self._key, 0, -1)
+            pipe.expire(self._key, int(10 * self._heartbeat_interval))
+            _, _, members, _ = pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(e)
+            self._assigned = list(range(self._shards))
+            return self._assigned
+
+        members = sorted(m.decode('utf-8') if isinstance(m, bytes) else m for m in members)
+        index, count = members.index(self.consumer_id), len(members)
+        self._assigned = [shard for shard in range(self._shards) if shard % count == index]
+        return self._assigned
+
+    def shard_order(self) -> List[int]:
+        # own shards first, then steal from the others so idle consumers
+        # still help. stealers start at different shards to spread out
+        own = self.assigned()
+        start = own[0] if own else os.getpid() % self._shards
+        others = [(start + i) % self._shards for i in range(self._shards)]
+        return own + [shard for shard in others if shard not in own]
+
+    def leave(self) -> None:
+        try:
+            self._redis.zrem(self._key, self.consumer_id)
+        except redis.RedisError as e:
+            logger.warning(e)
+        self._pid = None
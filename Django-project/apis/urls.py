@@ -0,0 +1,8 @@
+from django.urls import path
+from .views import breakers_status, metrics
+
+app_name = 'apis'
+urlpatterns = [
+    path('health/breakers', breakers_status, name='breakers_status'),
+    path('metrics', metrics, name='metrics'),
+]
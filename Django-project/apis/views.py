@@ -0,0 +1,22 @@
+from django.http import HttpResponse
+from django.views.decorators.http import require_http_methods
+
+from prometheus_client import CONTENT_TYPE_LATEST
+
+from apis.responses import ApiResponse
+from apis.breakers import breakers
+from apis.metrics import render_metrics
+
+
+@require_http_methods(["GET"])
+def breakers_status(request):
+    return ApiResponse(
+        data={
+            'breakers': {name: breaker.status() for name, breaker in breakers.items()}
+        }
+    ).response()
+
+
+@require_http_methods(["GET"])
+def metrics(request):
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,386 @@
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import time
+import itertools
+import zlib
+import random
+import threading
+
+import botocore.exceptions
+import pika.exceptions
+import requests
+
+
+class FaultInjector:
+    def __init__(self, latency_ms: float = 0, error_rate: float = 0, seed: Optional[int] = None) -> None:
+        self._latency = latency_ms / 1000
+        self._error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, error: Exception) -> None:
+        if self._latency > 0:
+            time.sleep(self._latency)
+        if self._error_rate > 0:
+            with self._lock:
+                failed = self._random.random() < self._error_rate
+            if failed:
+                raise error
+
+
+class FakeS3Resource:
+    """Just enough of the boto3 S3 resource API for _ObjectStorageClient."""
+
+    def __init__(self, faults: FaultInjector) -> None:
+        self._faults = faults
+        self._objects: Dict[str, Dict[str, bytes]] = defaultdict(dict)
+        self._modified: Dict[str, Dict[str, datetime]] = defaultdict(dict)
+        self._lock = threading.Lock()
+        self.meta = SimpleNamespace(client=_FakeS3Client(self))
+
+    def Bucket(self, name: str) -> '_FakeBucket':
+        return _FakeBucket(self, name)
+
+    def Object(self, bucket: str, key: str) -> '_FakeObject':
+        return _FakeObject(self, bucket, key)
+
+    def _fault(self) -> None:
+        self._faults(botocore.exceptions.EndpointConnectionError(endpoint_url='fake-s3'))
+
+    def _not_found(self, operation: str) -> botocore.exceptions.ClientError:
+        return botocore.exceptions.ClientError({'Error': {'Code': '404', 'Message': 'Not Found'}}, operation)
+
+
+class _FakeS3Client:
+    def __init__(self, resource: FakeS3Resource) -> None:
+        self._resource = resource
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes, ACL: str = 'private', **kwargs) -> None:
+        _FakeBucket(self._resource, Bucket).put_object(ACL=ACL, Body=Body, Key=Key)
+
+    def delete_objects(self, Bucket: str, Delete: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        self._resource._fault()
+        with self._resource._lock:
+            for item in Delete['Objects']:
+                self._resource._objects[Bucket].pop(item['Key'], None)
+        return {}
+
+    def list_objects_v2(
+            self,
+            Bucket: str,
+            Prefix: str = '',
+            MaxKeys: int = 1000,
+            ContinuationToken: str = '',
+            **kwargs
+        ) -> Dict[str, Any]:
+        self._resource._fault()
+        with self._resource._lock:
+            keys = sorted(k for k in self._resource._objects[Bucket] if k.startswith(Prefix) and k > ContinuationToken)
+            page = keys[:MaxKeys]
+            contents = [
+                {
+                    'Key': key,
+                    'Size': len(self._resource._objects[Bucket][key]),
+                    'LastModified': self._resource._modified[Bucket][key],
+                }
+                for key in page
+            ]
+        response = {'Contents': contents, 'IsTruncated': len(keys) > MaxKeys}
+        if response['IsTruncated']:
+            response['NextContinuationToken'] = page[-1]
+        return response
+
+
+class _FakeBucket:
+    def __init__(self, resource: FakeS3Resource, name: str) -> None:
+        self._resource = resource
+        self.name = name
+
+    def put_object(self, ACL: str, Body: bytes, Key: str, **kwargs) -> None:
+        self._resource._fault()
+        if hasattr(Body, 'read'):
+            Body = Body.read()
+        if not isinstance(Body, bytes) or not isinstance(Key, str):
+            raise botocore.exceptions.ParamValidationError(report='invalid parameters')
+        with self._resource._lock:
+            self._resource._objects[self.name][Key] = Body
+            self._resource._modified[self.name][Key] = datetime.now(timezone.utc)
+
+    def Object(self, key: str) -> '_FakeObject':
+        return _FakeObject(self._resource, self.name, key)
+
+
+class _FakeObject:
+    def __init__(self, resource: FakeS3Resource, bucket: str, key: str) -> None:
+        self._resource = resource
+        self._bucket = bucket
+        self.key = key
+
+    def load(self) -> None:
+        self._resource._fault()
+        with self._resource._lock:
+            if self.key not in self._resource._objects[self._bucket]:
+                raise self._resource._not_found('HeadObject')
+            self.content_length = len(self._resource._objects[self._bucket][self.key])
+            self.content_type = 'image/jpeg'
+
+    def delete(self) -> None:
+        self._resource._fault()
+        with self._resource._lock:
+            self._resource._objects[self._bucket].pop(self.key, None)
+
+
+class FakeAMQPBroker:
+    """In-memory queues shared by every FakeBlockingConnection."""
+
+    def __init__(self, faults: FaultInjector) -> None:
+        self.faults = faults
+        self.queues: Dict[str, deque] = defaultdict(deque)
+        self.bindings: Dict[str, Dict[str, List[str]]] = defaultdict(lambda: defaultdict(list))
+        self.exchanges: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+        self.pops: Dict[int, List[float]] = defaultdict(list)
+
+    def connection(self, parameters=None) -> 'FakeBlockingConnection':
+        return FakeBlockingConnection(self)
+
+
+class FakeBlockingConnection:
+    def __init__(self, broker: FakeAMQPBroker) -> None:
+        self._broker = broker
+        self.is_closed = False
+        self.is_open = True
+
+    def channel(self) -> '_FakeChannel':
+        return _FakeChannel(self._broker)
+
+    def close(self) -> None:
+        self.is_closed = True
+        self.is_open = False
+
+
+class _FakeChannel:
+    def __init__(self, broker: FakeAMQPBroker) -> None:
+        self._broker = broker
+        self.is_closed = False
+        self._unacked: Dict[int, tuple] = {}
+        self._delivery_tags = itertools.count(1)
+
+    def queue_declare(self, queue: str, passive: bool = False, **kwargs) -> SimpleNamespace:
+        with self._broker.lock:
+            count = len(self._broker.queues[queue])
+        return SimpleNamespace(method=SimpleNamespace(queue=queue, message_count=count))
+
+    def exchange_declare(self, exchange: str, exchange_type: str = 'direct', arguments=None, **kwargs) -> None:
+        with self._broker.lock:
+            self._broker.exchanges[exchange] = {'type': exchange_type, 'arguments': arguments or {}}
+
+    def queue_bind(self, queue: str, exchange: str, routing_key: str | None = None, **kwargs) -> None:
+        with self._broker.lock:
+            if queue not in self._broker.bindings[exchange][routing_key]:
+                self._broker.bindings[exchange][routing_key].append(queue)
+
+    def basic_publish(self, exchange: str, routing_key: str, body, properties=None, **kwargs) -> None:
+        self._broker.faults(pika.exceptions.AMQPConnectionError('fake broker failure'))
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        with self._broker.lock:
+            queues = self.__route(exchange, routing_key, properties)
+            for queue in queues:
+                self._broker.queues[queue].append((body, properties))
+
+    def __route(self, exchange: str, routing_key: str, properties) -> List[str]:
+        if exchange == '':
+            return [routing_key]
+        declared = self._broker.exchanges.get(exchange, {})
+        if declared.get('type') != 'x-consistent-hash':
+            return self._broker.bindings[exchange][routing_key]
+
+        queues = sorted({q for bound in self._broker.bindings[exchange].values() for q in bound})
+        header = declared['arguments'].get('hash-header')
+        key = (properties.headers or {}).get(header) if header and properties else routing_key
+        return [queues[zlib.crc32(str(key).encode('utf-8')) % len(queues)]] if queues else []
+
+    def basic_get(self, queue: str, auto_ack: bool = False):
+        self._broker.faults(pika.exceptions.AMQPConnectionError('fake broker failure'))
+        with self._broker.lock:
+            if not self._broker.queues[queue]:
+                return None, None, None
+            self._broker.pops[threading.get_ident()].append(time.perf_counter())
+            body, properties = self._broker.queues[queue].popleft()
+            delivery_tag = next(self._delivery_tags)
+            if not auto_ack:
+                self._unacked[delivery_tag] = (queue, body, properties)
+        return SimpleNamespace(delivery_tag=delivery_tag), properties, body
+
+    def basic_ack(self, delivery_tag: int) -> None:
+        with self._broker.lock:
+            self._unacked.pop(delivery_tag, None)
+
+    def basic_reject(self, delivery_tag: int, requeue: bool = True) -> None:
+        with self._broker.lock:
+            queue, body, properties = self._unacked.pop(delivery_tag)
+            if requeue:
+                self._broker.queues[queue].appendleft((body, properties))
+
+    def tx_select(self) -> None:
+        pass
+
+    def tx_commit(self) -> None:
+        pass
+
+
+class _FakeResponse:
+    def __init__(self, status_code: int, payload: Dict[str, Any]) -> None:
+        self.status_code = status_code
+        self.headers: Dict[str, str] = {}
+        self._payload = payload
+
+    def json(self) -> Dict[str, Any]:
+        return self._payload
+
+
+class FakeHTTP:
+    """Canned Imagga and Mailgun responders, installed in place of requests.request."""
+
+    def __init__(
+            self,
+            imagga_faults: FaultInjector,
+            mailgun_faults: FaultInjector,
+            vehicle_ratio: float = 0.8,
+            seed: Optional[int] = None
+        ) -> None:
+        self._imagga_faults = imagga_faults
+        self._mailgun_faults = mailgun_faults
+        self._vehicle_ratio = vehicle_ratio
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.sent_emails = 0
+
+    def __call__(self, method: str, url: str, **kwargs) -> _FakeResponse:
+        if 'api.imagga.com' in url:
+            self._imagga_faults(requests.exceptions.ConnectionError('fake imagga failure'))
+            with self._lock:
+                is_vehicle = self._random.random() < self._vehicle_ratio
+            tag = 'car' if is_vehicle else 'tree'
+            return _FakeResponse(200, {
+                'status': {'type': 'success', 'text': ''},
+                'result': {'tags': [{'confidence': 90.0, 'tag': {'en': tag}}]},
+            })
+
+        if 'api.mailgun.net' in url:
+            self._mailgun_faults(requests.exceptions.ConnectionError('fake mailgun failure'))
+            with self._lock:
+                self.sent_emails += 1
+            return _FakeResponse(200, {'message': 'Queued. Thank you.'})
+
+        raise requests.exceptions.ConnectionError(f'benchmarks do not reach {url}')
+
+
+class FakeRedis:
+    """Unlimited in-memory stand-in; rate limiting is not part of what we measure."""
+
+    def __init__(self) -> None:
+        self._data: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            return self._data.get(key)
+
+    def set(self, key: str, value, ex: Optional[int] = None, **kwargs) -> bool:
+        with self._lock:
+            self._data[key] = str(value).encode('utf-8')
+        return True
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        with self._lock:
+            value = int(self._data.get(key, 0)) + amount
+            self._data[key] = str(value).encode('utf-8')
+        return value
+
+    def decr(self, key: str, amount: int = 1) -> int:
+        return self.incr(key, -amount)
+
+    def expire(self, key: str, seconds: int) -> bool:
+        return key in self._data
+
+    def hget(self, key: str, field: str) -> Optional[bytes]:
+        with self._lock:
+            return self._data.get(key, {}).get(field)
+
+    def hset(self, key: str, field: str, value) -> int:
+        with self._lock:
+            self._data.setdefault(key, {})[field] = str(value).encode('utf-8')
+        return 1
+
+    def hincrby(self, key: str, field: str, amount: int = 1) -> int:
+        with self._lock:
+            fields = self._data.setdefault(key, {})
+            value = int(fields.get(field, 0)) + amount
+            fields[field] = str(value).encode('utf-8')
+        return value
+
+    def zadd(self, key: str, mapping: Dict[str, float]) -> int:
+        with self._lock:
+            members = self._data.setdefault(key, {})
+            added = sum(member not in members for member in mapping)
+            members.update(mapping)
+        return added
+
+    def zrem(self, key: str, *members: str) -> int:
+        with self._lock:
+            return sum(self._data.get(key, {}).pop(member, None) is not None for member in members)
+
+    def zremrangebyscore(self, key: str, min, max) -> int:
+        low, high = float(min), float(max)
+        with self._lock:
+            members = self._data.get(key, {})
+            removed = [member for member, score in members.items() if low <= score <= high]
+            for member in removed:
+                del members[member]
+        return len(removed)
+
+    def zcard(self, key: str) -> int:
+        with self._lock:
+            return len(self._data.get(key, {}))
+
+    def zrange(self, key: str, start: int, end: int) -> List[bytes]:
+        with self._lock:
+            members = sorted(self._data.get(key, {}).items(), key=lambda item: item[1])
+        members = members[start:] if end == -1 else members[start:end + 1]
+        return [member.encode('utf-8') for member, _ in members]
+
+    def publish(self, channel: str, message) -> int:
+        return 0
+
+    def pipeline(self) -> '_FakePipeline':
+        return _FakePipeline(self)
+
+    def register_script(self, script: str):
+        def unlimited(keys=None, args=None):
+            return [1, '1', '0', '-1']
+        return unlimited
+
+
+class _FakePipeline:
+    def __init__(self, redis: FakeRedis) -> None:
+        self._redis = redis
+        self._calls: List[Any] = []
+
+    def __getattr__(self, name: str):
+        def queue(*args, **kwargs) -> '_FakePipeline':
+            self._calls.append((getattr(self._redis, name), args, kwargs))
+            return self
+        return queue
+
+    def execute(self) -> List[Any]:
+        calls, self._calls = self._calls, []
+        return [call(*args, **kwargs) for call, args, kwargs in calls]
@@ -0,0 +1,469 @@
+"""
+End-to-end benchmarks for the ingest, outbox relay, read, batch read,
+validation and email paths.
+
+Every external service is replaced in-process (see benchmarks.fakes) so runs
+are offline and repeatable. Run from the Django-project directory:
+
+    python -m benchmarks.run --workloads ingest read validate --concurrency 1 8 \
+        --s3-latency-ms 20 --imagga-latency-ms 300 --output results.json
+
+and compare two runs with ``--compare previous.json``.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import resource
+import threading
+import tracemalloc
+import contextlib
+
+os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='vehicle ads end-to-end benchmarks')
+    parser.add_argument('--workloads', nargs='+', default=['ingest', 'relay', 'read', 'validate', 'email'],
+                        choices=['ingest', 'relay', 'read', 'batch', 'validate', 'email'])
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 4, 16])
+    parser.add_argument('--requests', type=int, default=500, help='operations per workload and concurrency level')
+    parser.add_argument('--batch-size', type=int, default=50, help='ads per request in the batch workload')
+    parser.add_argument('--relay-batch-size', type=int, default=100, help='outbox rows per relay_batch call')
+    parser.add_argument('--image-kb', type=int, default=256)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--shards', type=int, default=1, help='RABBITMQ_SHARDS for the validation queue')
+    parser.add_argument('--vehicle-ratio', type=float, default=0.8, help='share of images Imagga tags as vehicles')
+    for service in ('s3', 'amqp', 'imagga', 'mailgun'):
+        parser.add_argument(f'--{service}-latency-ms', type=float, default=0)
+        parser.add_argument(f'--{service}-error-rate', type=float, default=0)
+    parser.add_argument('--trace-memory', action='store_true', help='report tracemalloc peaks (slows every workload)')
+    parser.add_argument('--output', help='write JSON results to this file instead of stdout')
+    parser.add_argument('--compare', help='JSON results of a previous run to compare against')
+    return parser.parse_args(argv)
+
+
+def install_fakes(args: argparse.Namespace) -> Dict[str, Any]:
+    # must run before django.setup() so apis.clients binds to the fakes
+    import boto3
+    import pika
+    import redis
+    import requests
+
+    from benchmarks.fakes import (
+        FakeAMQPBroker,
+        FakeHTTP,
+        FakeRedis,
+        FakeS3Resource,
+        FaultInjector,
+    )
+
+    def faults(service: str) -> FaultInjector:
+        return FaultInjector(
+            latency_ms=getattr(args, f'{service}_latency_ms'),
+            error_rate=getattr(args, f'{service}_error_rate'),
+            seed=args.seed
+        )
+
+    broker = FakeAMQPBroker(faults('amqp'))
+    s3 = FakeS3Resource(faults('s3'))
+    http = FakeHTTP(faults('imagga'), faults('mailgun'), vehicle_ratio=args.vehicle_ratio, seed=args.seed)
+    fake_redis = FakeRedis()
+
+    pika.BlockingConnection = broker.connection
+    boto3.resource = lambda *a, **kw: s3
+    requests.request = http
+    redis.Redis.from_url = classmethod(lambda cls, url, **kw: fake_redis)
+
+    return {'broker': broker, 's3': s3, 'http': http, 'redis': fake_redis}
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def current_rss_kb() -> int | None:
+    # resident set size right now; only Linux exposes it without extra packages
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize() // 1024
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+@contextlib.contextmanager
+def sample_rss(interval: float = 0.005):
+    # ru_maxrss is the peak of the whole process, so every workload after the
+    # first would report the largest earlier peak. poll the current RSS instead
+    # and keep the highest value seen while this workload runs
+    peak = {'kb': current_rss_kb()}
+    if peak['kb'] is None:
+        yield peak
+        return
+
+    done = threading.Event()
+
+    def poll() -> None:
+        while not done.wait(interval):
+            peak['kb'] = max(peak['kb'], current_rss_kb() or 0)
+
+    thread = threading.Thread(target=poll, name='rss-sampler', daemon=True)
+    thread.start()
+    try:
+        yield peak
+    finally:
+        done.set()
+        thread.join()
+        peak['kb'] = max(peak['kb'], current_rss_kb() or 0)
+
+
+def measure(name: str, concurrency: int, args: argparse.Namespace, run: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    if args.trace_memory:
+        tracemalloc.start()
+
+    # only run() is timed; the workload did its seeding and resets before
+    # returning it. validate_ad reports progress with print(); keep it out
+    # of the timings
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), sample_rss() as rss:
+        outcome = run()
+    duration = time.perf_counter() - start
+
+    traced_peak = None
+    if args.trace_memory:
+        traced_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    latencies = outcome['latencies']
+    operations = outcome.get('operations', len(latencies))
+    result = {
+        'workload': name,
+        'concurrency': concurrency,
+        'operations': operations,
+        'errors': outcome['errors'],
+        'duration_s': duration,
+        'throughput_ops': operations / duration if duration > 0 else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': max(latencies, default=0.0) * 1000,
+        'peak_rss_kb': rss['kb'],
+        'process_peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'peak_traced_bytes': traced_peak,
+    }
+    print(
+        f"{name:>8} c={concurrency:<3} {result['throughput_ops']:10.1f} ops/s  "
+        f"p50 {result['p50_ms']:8.2f} ms  p99 {result['p99_ms']:8.2f} ms  errors {result['errors']}",
+        file=sys.stderr
+    )
+    return result
+
+
+def run_pool(concurrency: int, jobs: int, job: Callable[[int], bool]) -> Dict[str, Any]:
+    from django.db import connections
+
+    latencies: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+
+    def timed(i: int) -> None:
+        nonlocal errors
+        start = time.perf_counter()
+        ok = job(i)
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if not ok:
+                errors += 1
+
+    def close_connection(_: int) -> None:
+        connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, range(jobs)))
+        list(pool.map(close_connection, range(concurrency)))
+
+    return {'latencies': latencies, 'errors': errors}
+
+
+def seed_ads(count: int, rng: random.Random) -> List[int]:
+    from ads.models import VehicleAD
+
+    states = [VehicleAD.StateAD.ACCEPTED, VehicleAD.StateAD.REVIEW, VehicleAD.StateAD.REJECTED]
+    ads = [
+        VehicleAD(
+            description=f'benchmark ad {i}',
+            email=f'dealer{i % 50}@benchmarks.local',
+            image=f'http://fake-s3.local/benchmarks/{i}.jpg',
+            state=rng.choice(states),
+            category='car',
+        )
+        for i in range(count)
+    ]
+    VehicleAD.objects.bulk_create(ads, batch_size=500)
+    return list(VehicleAD.objects.order_by('-pk').values_list('pk', flat=True)[:count])
+
+
+def ingest_workload(fakes: Dict[str, Any], concurrency: int, args: argparse.Namespace) -> Callable[[], Dict[str, Any]]:
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from django.test import Client
+
+    image = os.urandom(args.image_kb * 1024)
+    local = threading.local()
+
+    def job(i: int) -> bool:
+        if not hasattr(local, 'client'):
+            local.client = Client()
+        response = local.client.post('/vehicle/ads/new', {
+            'email': f'dealer{i % 50}@benchmarks.local',
+            'description': f'benchmark ad {i}',
+            'image': SimpleUploadedFile(f'car{i}.jpg', image, content_type='image/jpeg'),
+        })
+        return response.status_code < 400
+
+    return lambda: run_pool(concurrency, args.requests, job)
+
+
+def relay_workload(fakes: Dict[str, Any], concurrency: int, args: argparse.Namespace) -> Callable[[], Dict[str, Any]]:
+    from django.db import connections
+
+    from ads.models import VehicleAD, OutboxMessage
+    from ads.outbox import relay_batch
+
+    # what ingest and validate leave behind: a validation and a received
+    # email per submitted ad, a result email per decided one
+    OutboxMessage.objects.all().delete()
+    ids = seed_ads(args.requests, random.Random(args.seed))
+    for ad in VehicleAD.objects.filter(pk__in=ids):
+        if ad.state == VehicleAD.StateAD.REVIEW:
+            OutboxMessage.for_submission([ad])
+        else:
+            OutboxMessage.for_decision(ad)
+    messages = OutboxMessage.objects.count()
+
+    latencies: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+    # sqlite has no SKIP LOCKED: concurrent relays would fail on each other's
+    # write locks instead of taking different rows, so they take turns here
+    turns = threading.Lock()
+
+    def drain(_: int) -> None:
+        nonlocal errors
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    with turns:
+                        relayed = relay_batch(args.relay_batch_size)
+                except Exception:
+                    with lock:
+                        errors += 1
+                    continue
+                if not relayed:
+                    break
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+        finally:
+            connections.close_all()
+
+    def run() -> Dict[str, Any]:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(drain, range(concurrency)))
+        # latencies are per relay_batch call, throughput per outbox row
+        left = OutboxMessage.objects.count()
+        return {'latencies': latencies, 'operations': messages - left, 'errors': errors + left}
+
+    return run
+
+
+def read_workload(fakes: Dict[str, Any], concurrency: int, args: argparse.Namespace) -> Callable[[], Dict[str, Any]]:
+    from django.test import Client
+
+    rng = random.Random(args.seed)
+    ids = seed_ads(args.requests, rng)
+    targets = [rng.choice(ids) for _ in range(args.requests)]
+    local = threading.local()
+
+    def job(i: int) -> bool:
+        if not hasattr(local, 'client'):
+            local.client = Client()
+        response = local.client.get(f'/vehicle/ads/{targets[i]}')
+        return response.status_code < 500
+
+    return lambda: run_pool(concurrency, args.requests, job)
+
+
+def batch_workload(fakes: Dict[str, Any], concurrency: int, args: argparse.Namespace) -> Callable[[], Dict[str, Any]]:
+    from django.test import Client
+
+    rng = random.Random(args.seed)
+    ids = seed_ads(args.requests, rng)
+    targets = [','.join(str(rng.choice(ids)) for _ in range(args.batch_size)) for _ in range(args.requests)]
+    local = threading.local()
+
+    def job(i: int) -> bool:
+        if not hasattr(local, 'client'):
+            local.client = Client()
+        response = local.client.get('/vehicle/ads/batch', {'ids': targets[i]})
+        return response.status_code < 400
+
+    return lambda: run_pool(concurrency, args.requests, job)
+
+
+def validate_workload(fakes: Dict[str, Any], concurrency: int, args: argparse.Namespace) -> Callable[[], Dict[str, Any]]:
+    from django.db import connections
+
+    from ads.models import VehicleAD
+    from ads.tasks import validate_ad
+    from apis.clients import rabbitmq
+
+    broker = fakes['broker']
+    ids = seed_ads(args.requests, random.Random(args.seed))
+    VehicleAD.objects.filter(pk__in=ids).update(state=VehicleAD.StateAD.REVIEW, category=None)
+    # spread over the shard queues directly; publishing is what the relay
+    # workload measures. drop what earlier workloads left in them
+    queues = rabbitmq.queue_names[1:] or rabbitmq.queue_names
+    with broker.lock:
+        for queue in rabbitmq.queue_names:
+            broker.queues[queue].clear()
+        for i, pk in enumerate(ids):
+            broker.queues[queues[i % len(queues)]].append((str(pk).encode('utf-8'), None))
+        broker.pops.clear()
+
+    errors = 0
+    lock = threading.Lock()
+
+    def consume(_: int) -> None:
+        nonlocal errors
+        try:
+            validate_ad()
+        except Exception:
+            with lock:
+                errors += 1
+        finally:
+            with broker.lock:
+                broker.pops[threading.get_ident()].append(time.perf_counter())
+            connections.close_all()
+
+    def run() -> Dict[str, Any]:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(consume, range(concurrency)))
+
+        # time between consecutive pops on one consumer is the time spent on
+        # one ad; the consumer returning closes the last interval
+        latencies = []
+        for pops in broker.pops.values():
+            latencies.extend(b - a for a, b in zip(pops, pops[1:]))
+
+        not_moderated = VehicleAD.objects.filter(pk__in=ids, state=VehicleAD.StateAD.REVIEW).count()
+        return {'latencies': latencies, 'errors': errors + not_moderated}
+
+    return run
+
+
+def email_workload(fakes: Dict[str, Any], concurrency: int, args: argparse.Namespace) -> Callable[[], Dict[str, Any]]:
+    from ads.models import VehicleAD
+    from ads.tasks import send_received_email, send_success_email, send_failure_email
+
+    ids = seed_ads(args.requests, random.Random(args.seed))
+    ads = list(VehicleAD.objects.filter(pk__in=ids).only('email', 'state'))
+
+    def job(i: int) -> bool:
+        # called directly, the tasks run here instead of on a worker
+        ad = ads[i % len(ads)]
+        try:
+            if ad.state == VehicleAD.StateAD.ACCEPTED:
+                send_success_email(ad.email, ad.pk)
+            elif ad.state == VehicleAD.StateAD.REJECTED:
+                send_failure_email(ad.email)
+            else:
+                send_received_email(ad.email)
+        except Exception:
+            return False
+        return True
+
+    return lambda: run_pool(concurrency, args.requests, job)
+
+
+WORKLOADS = {
+    'ingest': ingest_workload,
+    'relay': relay_workload,
+    'read': read_workload,
+    'batch': batch_workload,
+    'validate': validate_workload,
+    'email': email_workload,
+}
+
+
+def compare(results: List[Dict[str, Any]], previous_path: str) -> None:
+    with open(previous_path) as f:
+        previous = {(r['workload'], r['concurrency']): r for r in json.load(f)['results']}
+
+    print(f"\ncompared with {previous_path}:", file=sys.stderr)
+    for result in results:
+        before = previous.get((result['workload'], result['concurrency']))
+        if before is None:
+            continue
+        deltas = []
+        for key in ('throughput_ops', 'p50_ms', 'p99_ms'):
+            if before[key]:
+                deltas.append(f"{key} {100 * (result[key] - before[key]) / before[key]:+.1f}%")
+        print(f"{result['workload']:>8} c={result['concurrency']:<3} " + '  '.join(deltas), file=sys.stderr)
+
+
+def main(argv: List[str] | None = None) -> None:
+    args = parse_args(argv)
+    os.environ['RABBITMQ_SHARDS'] = str(args.shards)
+
+    from benchmarks import settings as benchmark_settings
+    db_path = benchmark_settings.DATABASES['default']['NAME']
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    fakes = install_fakes(args)
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+    results = []
+    for name in args.workloads:
+        for concurrency in args.concurrency:
+            run = WORKLOADS[name](fakes, concurrency, args)
+            results.append(measure(name, concurrency, args, run))
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'arguments': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+        },
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 import os
 import ssl
 from celery import Celery
+from celery.signals import celeryd_init, worker_process_shutdown, worker_shutdown
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "vehicle_ads.settings")
 app = Celery('vehicle_ads',
@@ -13,3 +14,19 @@ app = Celery('vehicle_ads',
 )
 app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
+
+
+@celeryd_init.connect
+def install_profiling_hooks(**kwargs):
+    from apis.profiling import install_celery_hooks
+    install_celery_hooks()
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def leave_validation_shards(**kwargs):
+    # hand our shards to the other consumers now instead of after the heartbeat
+    # expires. prefork children send worker_process_shutdown, the solo pool
+    # consumes in the main process and only sends worker_shutdown
+    from apis.clients import rabbitmq
+    rabbitmq.leave_shards()
@@ -45,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'apis.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,6 +53,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'apis.db_routing.PrimaryPinningMiddleware',
 ]
 
 ROOT_URLCONF = 'vehicle_ads.urls'
@@ -86,9 +88,21 @@ DATABASES = {
         'PASSWORD': env('DB_PASSWORD'),
         'HOST': env('DB_HOST'),
         'PORT': env('DB_PORT'),
+        'CONN_MAX_AGE': env.int('DB_CONN_MAX_AGE', default=600),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+for i, host in enumerate(env.list('DB_REPLICA_HOSTS', default=[])):
+    DATABASES[f'replica_{i}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['apis.db_routing.ReplicaRouter']
+DATABASE_REPLICA_PIN_SECONDS = env.int('DATABASE_REPLICA_PIN_SECONDS', default=30)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -137,6 +151,9 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 BASE_URL = env('BASE_URL')
 
+BULK_MAX_ADS = env.int('BULK_MAX_ADS', default=100)
+BATCH_MAX_IDS = env.int('BATCH_MAX_IDS', default=200)
+
 VALID_CATEGORIES = [
     'car',
     'vehicle',
@@ -160,16 +177,81 @@ AWS_DEFAULT_ACL = env('AWS_DEFAULT_ACL')
 AWS_S3_REGION_NAME = env('AWS_S3_REGION_NAME')
 AWS_S3_ENDPOINT_URL = env('AWS_S3_ENDPOINT_URL')
 AWS_S3_GET_URL = AWS_S3_ENDPOINT_URL + '/' + AWS_STORAGE_BUCKET_NAME + '/'
+AWS_S3_TIMEOUT = env.float('AWS_S3_TIMEOUT', default=10.0)
+AWS_S3_MAX_CONCURRENCY = env.int('AWS_S3_MAX_CONCURRENCY', default=8)
+
+UPLOAD_MAX_SIZE = env.int('UPLOAD_MAX_SIZE', default=10 * 1024 * 1024)
+UPLOAD_URL_EXPIRES_IN = env.int('UPLOAD_URL_EXPIRES_IN', default=900)
+UPLOAD_ALLOWED_CONTENT_TYPES = env.list(
+    'UPLOAD_ALLOWED_CONTENT_TYPES',
+    default=['image/jpeg', 'image/png', 'image/webp']
+)
 
 RABBITMQ_QUEUE_NAME = env('RABBITMQ_QUEUE_NAME')
 RABBITMQ_AMQP_URL = env('RABBITMQ_AMQP_URL')
+RABBITMQ_TIMEOUT = env.float('RABBITMQ_TIMEOUT', default=10.0)
+RABBITMQ_RETRY_DELAYS = env.list('RABBITMQ_RETRY_DELAYS', cast=int, default=[10, 60, 300, 1800])
+RABBITMQ_MAX_ATTEMPTS = env.int('RABBITMQ_MAX_ATTEMPTS', default=5)
+RABBITMQ_MAX_PRIORITY = env.int('RABBITMQ_MAX_PRIORITY', default=0)
+RABBITMQ_SHARDS = env.int('RABBITMQ_SHARDS', default=1)
+RABBITMQ_SHARD_HEARTBEAT_INTERVAL = env.float('RABBITMQ_SHARD_HEARTBEAT_INTERVAL', default=10.0)
+
+FAIR_SCHEDULING_MAX_CONCURRENCY = env.int('FAIR_SCHEDULING_MAX_CONCURRENCY', default=0)
+FAIR_SCHEDULING_CONCURRENCY = env.dict('FAIR_SCHEDULING_CONCURRENCY', cast={'value': int}, default={})
+FAIR_SCHEDULING_WEIGHTS = env.dict('FAIR_SCHEDULING_WEIGHTS', cast={'value': float}, default={})
+FAIR_SCHEDULING_MAX_DEFERRALS = env.int('FAIR_SCHEDULING_MAX_DEFERRALS', default=20)
+
+OUTBOX_BATCH_SIZE = env.int('OUTBOX_BATCH_SIZE', default=500)
+OUTBOX_POLL_INTERVAL = env.float('OUTBOX_POLL_INTERVAL', default=0.5)
+
+STATS_DEFAULT_DAYS = env.int('STATS_DEFAULT_DAYS', default=7)
+STATS_MAX_DAYS = env.int('STATS_MAX_DAYS', default=90)
+STATS_COUNTER_SLOTS = env.int('STATS_COUNTER_SLOTS', default=16)
+
+RETENTION_REJECTED_DAYS = env.int('RETENTION_REJECTED_DAYS', default=30)
+RETENTION_PENDING_DAYS = env.int('RETENTION_PENDING_DAYS', default=2)
+RETENTION_ACCEPTED_DAYS = env.int('RETENTION_ACCEPTED_DAYS', default=0)
+RETENTION_CHUNK_SIZE = env.int('RETENTION_CHUNK_SIZE', default=500)
+RETENTION_CHUNK_SLEEP = env.float('RETENTION_CHUNK_SLEEP', default=0.5)
+
+RECONCILE_GRACE_HOURS = env.float('RECONCILE_GRACE_HOURS', default=24.0)
+
+ADMISSION_MAX_QUEUE_DEPTH = env.int('ADMISSION_MAX_QUEUE_DEPTH', default=10000)
+ADMISSION_MAX_VALIDATION_LAG = env.float('ADMISSION_MAX_VALIDATION_LAG', default=600.0)
+ADMISSION_REFRESH_INTERVAL = env.float('ADMISSION_REFRESH_INTERVAL', default=5.0)
+ADMISSION_RETRY_AFTER = env.int('ADMISSION_RETRY_AFTER', default=30)
 
 CELERY_BROKER_URL = env('CELERY_BROKER_URL')
 CELERY_RESULT_BACKEND = CELERY_BROKER_URL
 
+REDIS_URL = env('REDIS_URL', default=CELERY_BROKER_URL)
+
+MODERATION_CHANNEL = env('MODERATION_CHANNEL', default='ads:moderated')
+LONG_POLL_TIMEOUT = env.float('LONG_POLL_TIMEOUT', default=30.0)
+LONG_POLL_MAX_TIMEOUT = env.float('LONG_POLL_MAX_TIMEOUT', default=60.0)
+# where the ASGI server answers /wait; the WSGI server redirects there
+LONG_POLL_URL = env('LONG_POLL_URL', default='')
+
 IMAGGA_API_KEY = env('IMAGGA_API_KEY')
 IMAGGA_API_SECRET = env('IMAGGA_API_SECRET')
+IMAGGA_RATE_LIMIT_PER_SECOND = env.float('IMAGGA_RATE_LIMIT_PER_SECOND', default=1.0)
+IMAGGA_RATE_LIMIT_BURST = env.int('IMAGGA_RATE_LIMIT_BURST', default=1)
+IMAGGA_RATE_LIMIT_MAX_WAIT = env.float('IMAGGA_RATE_LIMIT_MAX_WAIT', default=2.0)
+IMAGGA_MONTHLY_QUOTA = env.int('IMAGGA_MONTHLY_QUOTA', default=0)
+IMAGGA_TIMEOUT = env.float('IMAGGA_TIMEOUT', default=15.0)
 
 EMAIL_BACKEND = 'django_mailgun_mime.backends.MailgunMIMEBackend'
 MAILGUN_API_KEY = env('MAILGUN_API_KEY')
 MAILGUN_DOMAIN_NAME = env('MAILGUN_DOMAIN_NAME')
+MAILGUN_TIMEOUT = env.float('MAILGUN_TIMEOUT', default=10.0)
+EMAIL_MAX_RETRIES = env.int('EMAIL_MAX_RETRIES', default=10)
+EMAIL_RETRY_BACKOFF_MAX = env.int('EMAIL_RETRY_BACKOFF_MAX', default=3600)
+
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = env.int('CIRCUIT_BREAKER_FAILURE_THRESHOLD', default=5)
+CIRCUIT_BREAKER_RESET_TIMEOUT = env.float('CIRCUIT_BREAKER_RESET_TIMEOUT', default=30.0)
+
+PROFILING_ENABLED = env.bool('PROFILING_ENABLED', default=False)
+PROFILING_SAMPLE_RATE = env.float('PROFILING_SAMPLE_RATE', default=0.0)
+PROFILING_DIR = env('PROFILING_DIR', default=str(BASE_DIR / 'profiles'))
+PROFILING_HEADER = 'X-Profile'
+PROFILING_TOKEN_MAX_AGE = env.int('PROFILING_TOKEN_MAX_AGE', default=3600)
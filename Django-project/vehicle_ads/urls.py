@@ -19,4 +19,5 @@ from django.urls import path, include
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('vehicle/', include('ads.urls')),
+    path('', include('apis.urls')),
 ]
@@ -1,3 +1,12 @@
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/vehicle_ads_metrics}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+export LONG_POLL_URL=${LONG_POLL_URL:-http://127.0.0.1:8001}
+
 python3 Django-project/manage.py runserver &
+# long-poll waits (ads/<id>/wait) are async views served by this ASGI server;
+# runserver redirects them to LONG_POLL_URL. its connections are not kept
+# between requests, waiters would pin one each
+DB_CONN_MAX_AGE=0 python3 -m uvicorn vehicle_ads.asgi:application --app-dir Django-project --port 8001 &
+python3 Django-project/manage.py relay_outbox &
 cd Django-project/
 python3 -m celery -A vehicle_ads worker -l info --pool=solo